@@ -0,0 +1,50 @@
+import time
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.adstock import geometric_adstock, adstock_grid, weibull_adstock
+
+
+def apply_adstock(spend, decay=0.6):
+    # The per-channel loop previously used in generate_plots.py / the notebook
+    adstocked = np.zeros_like(spend)
+    for i in range(len(spend)):
+        adstocked[i] = spend[i] + (decay * adstocked[i-1] if i > 0 else 0)
+    return adstocked
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def run_benchmark(n_weeks=10_000, n_channels=500, n_decays=20):
+    rng = np.random.default_rng(42)
+    spend = rng.uniform(0, 5000, (n_weeks, n_channels))
+    print(f"{n_weeks} weeks x {n_channels} channels")
+
+    loop, t_loop = timed(lambda: np.column_stack([apply_adstock(spend[:, c]) for c in range(n_channels)]))
+    fast, t_fast = timed(geometric_adstock, spend, 0.6)
+    print(f"geometric, decay=0.6:  loop {t_loop:.2f}s, vectorized {t_fast:.3f}s "
+          f"({t_loop / t_fast:.0f}x), identical: {np.array_equal(loop, fast)}")
+
+    decays = rng.uniform(0.05, 0.95, n_channels)
+    _, t_channel = timed(geometric_adstock, spend, decays)
+    print(f"geometric, per-channel decay: {t_channel:.3f}s")
+
+    grid = np.linspace(0.05, 0.95, n_decays)
+    tensor, t_grid = timed(adstock_grid, spend, decay=grid)
+    print(f"geometric grid ({n_decays} decays -> {tensor.shape}): {t_grid:.2f}s "
+          f"(loop estimate {t_loop * n_decays:.0f}s)")
+
+    _, t_weibull = timed(weibull_adstock, spend, shape=2.0, scale=0.3, max_lag=13)
+    print(f"weibull pdf, 13 lags: {t_weibull:.3f}s")
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]]
+    run_benchmark(*args)
@@ -0,0 +1,44 @@
+import json
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.generate_data import generate_marketing_vectorized
+from src.mmm_bayes import fit_bayesian_mmm
+
+
+def run_benchmark(n_channels=20, n_chains=4, n_warmup=1000, n_draws=1000):
+    # Three years of weekly national data from the geo generator's ground truth
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'marketing.csv')
+        generate_marketing_vectorized(n_regions=1, n_channels=n_channels, freq='W', output_path=path,
+                                      start_date=datetime(2022, 1, 1), end_date=datetime(2024, 12, 31))
+        df = pd.read_csv(path)
+        with open(f'{path}.truth.json') as f:
+            truth = json.load(f)['channels']
+
+    spend = df.pivot(index='date', columns='channel', values='spend')
+    target = df.groupby('date')['conversions'].sum()
+    print(f"{len(spend)} weeks x {n_channels} channels, {n_chains} chains x ({n_warmup} warmup + {n_draws} draws)")
+
+    fit = fit_bayesian_mmm(spend, target, n_chains=n_chains, n_warmup=n_warmup, n_draws=n_draws)
+    print(f"sampled in {fit.seconds:.1f}s: accept rate {fit.accept_rate:.2f}, step size {fit.step_size:.3f}, "
+          f"{fit.divergences} divergences")
+    print(f"max R-hat {fit.summary['r_hat'].max():.3f}, min ESS {fit.summary['ess'].min():.0f}, "
+          f"median ESS {fit.summary['ess'].median():.0f}")
+
+    decay = fit.summary.loc[[f'decay[{ch}]' for ch in spend.columns]]
+    true_decay = np.array([truth[ch]['decay'] for ch in spend.columns])
+    covered = ((decay['q5'].values <= true_decay) & (true_decay <= decay['q95'].values)).mean()
+    print(f"decay: mean abs error {np.abs(decay['mean'].values - true_decay).mean():.3f}, "
+          f"90% interval coverage {covered:.0%}")
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]]
+    run_benchmark(*args)
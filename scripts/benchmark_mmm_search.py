@@ -0,0 +1,50 @@
+import time
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.adstock import geometric_adstock
+from src.mmm_search import decay_grid_search
+
+
+def synthetic_mmm(n_channels, n_weeks=156, decay=0.5, seed=42):
+    # Weekly spend with positive log-saturated effects at a common true decay
+    rng = np.random.default_rng(seed)
+    spend = pd.DataFrame(rng.gamma(2.0, 500.0, (n_weeks, n_channels)),
+                         columns=[f'channel_{c}' for c in range(n_channels)])
+    effects = rng.uniform(5, 30, n_channels)
+    target = np.log1p(geometric_adstock(spend.values, decay)) @ effects + 100 + rng.normal(0, 10, n_weeks)
+    return spend, target
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def run_benchmark(n_channels=8, n_small=3):
+    # Regression check: coordinate descent (forced with max_combinations=1)
+    # against the exhaustive search on a small grid, sign-constrained
+    spend, target = synthetic_mmm(n_small)
+    decays = np.round(np.arange(0.0, 0.951, 0.15), 2)
+    exhaustive, t_exhaustive = timed(decay_grid_search, spend, target, decays, n_workers=1)
+    descent, t_descent = timed(decay_grid_search, spend, target, decays, max_combinations=1)
+    print(f"{n_small} channels x {len(decays)} decays: exhaustive R² {exhaustive.r2:.4f} ({t_exhaustive:.2f}s), "
+          f"descent R² {descent.r2:.4f} ({t_descent:.2f}s), same picks: "
+          f"{exhaustive.table['decay'].equals(descent.table['decay'])}")
+
+    spend, target = synthetic_mmm(n_channels)
+    for positive in (True, False):
+        search, seconds = timed(decay_grid_search, spend, target, max_combinations=1, positive=positive)
+        print(f"{n_channels} channels, descent, positive={positive}: R² {search.r2:.4f}, "
+              f"decays {search.table['decay'].min():.2f}-{search.table['decay'].max():.2f} (true 0.5), "
+              f"{int((search.table['coef'] < 0).sum())} negative, {seconds:.2f}s")
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]]
+    run_benchmark(*args)
@@ -0,0 +1,54 @@
+import time
+import os
+import sys
+import warnings
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from datetime import datetime
+from lifetimes.utils import summary_data_from_transaction_data
+from src.generate_data import _simulate_transaction_batch, _shard_rng
+from src.array_cache import arrays_from_frame, get_transaction_arrays, transactions_frame
+from src.rfm import rfm_from_arrays
+
+warnings.filterwarnings('ignore')
+
+
+def load_benchmark_data(n_customers=None):
+    # Project data by default; otherwise a synthetic batch of n_customers
+    if n_customers is None:
+        return transactions_frame(get_transaction_arrays())
+    batch = _simulate_transaction_batch(_shard_rng(42, 0), 0, n_customers,
+                                        datetime(2023, 1, 1), datetime(2024, 12, 31))
+    batch['transaction_date'] = pd.to_datetime(batch['transaction_date'].astype(str))
+    return batch
+
+
+def run_benchmark(n_customers=None):
+    df_trans = load_benchmark_data(n_customers)
+    end = df_trans['transaction_date'].max()
+    print(f"{len(df_trans)} transactions, {df_trans['customer_id'].nunique()} customers")
+
+    t0 = time.perf_counter()
+    arrays = arrays_from_frame(df_trans)
+    t1 = time.perf_counter()
+    ours = rfm_from_arrays(arrays, end)
+    t2 = time.perf_counter()
+    theirs = summary_data_from_transaction_data(
+        df_trans.astype({'customer_id': str}), 'customer_id', 'transaction_date', 'amount',
+        observation_period_end=end
+    )
+    t3 = time.perf_counter()
+
+    theirs = theirs.loc[ours.index]
+    exact = (ours[['frequency', 'recency', 'T']].values == theirs[['frequency', 'recency', 'T']].values).all()
+    print(f"rfm_from_arrays:   {t2 - t1:8.3f}s (+{t1 - t0:.3f}s to sort into arrays)")
+    print(f"lifetimes summary: {t3 - t2:8.3f}s ({(t3 - t2) / (t2 - t1):.1f}x slower)")
+    print(f"frequency/recency/T identical: {exact}; "
+          f"max |monetary_value diff|: {np.abs(ours['monetary_value'] - theirs['monetary_value']).max():.2e}")
+
+
+if __name__ == "__main__":
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else None)
@@ -1,8 +1,13 @@
-import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
 import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.data_store import load_marketing
+from src.mmm_search import decay_grid_search
+from src.mmm_bootstrap import bootstrap_mmm, response_band
 
 # Ensure plots directory exists
 if not os.path.exists('plots'):
@@ -12,7 +17,7 @@ if not os.path.exists('plots'):
 sns.set(style='whitegrid', palette='muted')
 
 # Load data
-df_mmm = pd.read_csv('data/marketing_spend.csv')
+df_mmm = load_marketing()
 
 # 1. Total Spend Share (Combined Pie & Trends)
 spend_share = df_mmm.groupby('channel')['spend'].sum()
@@ -47,12 +52,18 @@ plt.close()
 mmm_pivot = df_mmm.pivot(index='date', columns='channel', values='spend').fillna(0)
 target = df_mmm.groupby('date')['conversions'].sum()
 channels = mmm_pivot.columns
+# One block bootstrap of the MMM fit gives every panel its interval band
+search = decay_grid_search(mmm_pivot, target)
+boot = bootstrap_mmm(search.design, target, spend=mmm_pivot)
 
 fig, axes = plt.subplots(1, len(channels), figsize=(20, 5), sharey=True)
 for i, col in enumerate(channels):
-    raw_spend = df_mmm[df_mmm['channel'] == col].sort_values('date')['spend'].values
-    sns.regplot(x=raw_spend, y=target.values, ax=axes[i], logx=True, 
-                scatter_kws={'alpha':0.5}, line_kws={'color':'red'})
+    raw_spend = mmm_pivot[col].values
+    spend_grid = np.linspace(raw_spend.min(), raw_spend.max(), 100)
+    band = response_band(boot, search, col, spend_grid)
+    axes[i].scatter(raw_spend, target.values, alpha=0.5)
+    axes[i].plot(spend_grid, band['mean'], color='red')
+    axes[i].fill_between(spend_grid, band['lower'], band['upper'], color='red', alpha=0.2)
     axes[i].set_title(f'Saturation: {col}')
     axes[i].set_xlabel('Spend ($)')
     axes[i].set_ylabel('Conversions' if i==0 else '')
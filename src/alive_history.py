@@ -0,0 +1,104 @@
+import pandas as pd
+import numpy as np
+
+from src.rfm import _collapse_periods, _period_index, _to_day
+from src.clv_scoring import bgnbd_p_alive
+
+
+def week_end_dates(arrays, start=None, end=None):
+    """Sundays (W-SUN week ends) from the first to the last transaction week, or between start/end."""
+    start = pd.Timestamp(np.datetime64(int(np.min(arrays.day)), 'D')) if start is None else pd.Timestamp(start)
+    end = pd.Timestamp(np.datetime64(int(np.max(arrays.day)), 'D')) if end is None else pd.Timestamp(end)
+    return pd.date_range(start, end + pd.Timedelta(days=6), freq='W-SUN')
+
+
+def _history_chunk(params, customer, period, n_customers, date_periods):
+    # Running frequency/recency of every customer at every date. Each
+    # collapsed purchase row first counts at the earliest date on or after
+    # its period; a cumulative sum along dates gives rows seen so far.
+    n_dates = len(date_periods)
+    column = np.searchsorted(date_periods, period, side='left')
+    seen = column < n_dates
+    counts = np.bincount(customer[seen] * n_dates + column[seen], minlength=n_customers * n_dates)
+    n_rows = counts.reshape(n_customers, n_dates).cumsum(axis=1)
+
+    first_row = np.concatenate([[0], np.cumsum(np.bincount(customer, minlength=n_customers))[:-1]])
+    acquired = n_rows > 0
+    last_row = first_row[:, None] + np.maximum(n_rows, 1) - 1
+    first_period = period[np.minimum(first_row, len(period) - 1)][:, None]
+    frequency = (n_rows - 1).astype(float)
+    recency = (period[last_row] - first_period).astype(float)
+    T = (date_periods[None, :] - first_period).astype(float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        alive = bgnbd_p_alive(params, np.maximum(frequency, 0), recency, T)
+    return np.where(acquired, alive, np.nan).astype(np.float32)
+
+
+def p_alive_history(arrays, bgnbd_params, dates=None, freq='D', chunk_customers=50_000, output_path=None):
+    """P(alive) of every customer at every date as a (customers x dates) float32 matrix.
+
+    Equivalent to building lifetimes' RFM summary at each date and calling
+    ``conditional_probability_alive``, but done in one cumulative pass per
+    chunk of customers over the customer-sorted TransactionArrays.
+    ``dates`` default to every week end spanned by the log; ``freq`` is the
+    time unit the BG/NBD parameters were fitted in. Entries before a
+    customer's first purchase are NaN.
+
+    Returns a DataFrame indexed by customer_id with one column per date.
+    With ``output_path`` the matrix is written chunk by chunk instead, as a
+    ``.npy`` file (returned as a memory-mapped frame) or as a long-format
+    Parquet table (customer_id, date, p_alive; the path is returned).
+    """
+    dates = week_end_dates(arrays) if dates is None else pd.DatetimeIndex(dates)
+    date_periods = _period_index(np.array([_to_day(d) for d in dates]), freq)
+    customer_ids = np.asarray(arrays.customer_ids)
+    offsets = np.asarray(arrays.offsets)
+    n = len(customer_ids)
+
+    if output_path is None:
+        out = np.empty((n, len(dates)), dtype=np.float32)
+    elif output_path.endswith('.npy'):
+        out = np.lib.format.open_memmap(output_path, mode='w+', dtype=np.float32, shape=(n, len(dates)))
+    else:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        out, writer = None, None
+
+    for start in range(0, n, chunk_customers):
+        stop = min(start + chunk_customers, n)
+        rows = slice(offsets[start], offsets[stop])
+        day = np.asarray(arrays.day[rows]).astype(np.int64)
+        customer, period, _ = _collapse_periods(np.asarray(arrays.customer[rows]) - start,
+                                                _period_index(day, freq), np.zeros(len(day)))
+        alive = _history_chunk(bgnbd_params, customer, period, stop - start, date_periods)
+        if out is not None:
+            out[start:stop] = alive
+            continue
+        table = pa.table({
+            'customer_id': np.repeat(customer_ids[start:stop], len(dates)),
+            'date': np.tile(dates.values.astype('datetime64[D]'), stop - start),
+            'p_alive': alive.ravel(),
+        })
+        writer = writer or pq.ParquetWriter(output_path, table.schema)
+        writer.write_table(table)
+
+    if out is None:
+        if writer is not None:
+            writer.close()
+        return output_path
+    if isinstance(out, np.memmap):
+        out.flush()
+    return pd.DataFrame(out, index=pd.Index(customer_ids, name='customer_id'), columns=dates, copy=False)
+
+
+def churn_dates(history, threshold=0.5):
+    """Date from which each customer's P(alive) stays below ``threshold`` (NaT if it never drops)."""
+    values = np.asarray(history)
+    above = values >= threshold
+    # Last date at or above the threshold; the next date is the churn date
+    last_above = values.shape[1] - 1 - np.argmax(above[:, ::-1], axis=1)
+    churned = above.any(axis=1) & (last_above < values.shape[1] - 1)
+    dates = np.asarray(history.columns, dtype='datetime64[ns]')
+    result = np.full(len(values), np.datetime64('NaT'), dtype='datetime64[ns]')
+    result[churned] = dates[last_above[churned] + 1]
+    return pd.Series(result, index=history.index, name='churn_date')
@@ -0,0 +1,98 @@
+import pandas as pd
+import numpy as np
+from collections import namedtuple
+import json
+import os
+
+from src.data_store import load_transactions, STORE_DIR, TRANSACTIONS_CSV
+
+CACHE_DIR = 'data/cache/transactions'
+
+# Customer-sorted columnar view of the transaction log. Rows of customer i
+# are customer[offsets[i]:offsets[i + 1]] (likewise day/amount), ordered by
+# day. `day` is days since 1970-01-01; `customer_ids[i]` is the original ID.
+TransactionArrays = namedtuple('TransactionArrays', ['customer_ids', 'customer', 'day', 'amount', 'offsets'])
+
+_ARRAYS = ('customer', 'day', 'amount', 'offsets', 'customer_ids')
+
+
+def _source_fingerprint(csv_path, store_path):
+    # Any change to the backing store or CSV (size/mtime) invalidates the cache
+    if os.path.isdir(store_path):
+        stats = [os.stat(os.path.join(root, name))
+                 for root, _, files in os.walk(store_path) for name in files]
+        return {'source': store_path, 'size': sum(s.st_size for s in stats),
+                'mtime': max((s.st_mtime for s in stats), default=0)}
+    stat = os.stat(csv_path)
+    return {'source': csv_path, 'size': stat.st_size, 'mtime': stat.st_mtime}
+
+
+def arrays_from_frame(df_trans):
+    """Sort a transactions frame by (customer, date) into TransactionArrays."""
+    ids = df_trans['customer_id'].astype('category').cat.remove_unused_categories()
+    categories = np.asarray(ids.cat.categories, dtype=str)
+    # Re-code so customer codes follow the sorted ID order
+    rank = np.empty(len(categories), dtype=np.int32)
+    rank[np.argsort(categories, kind='stable')] = np.arange(len(categories), dtype=np.int32)
+    customer = rank[ids.cat.codes.values]
+    day = df_trans['transaction_date'].values.astype('datetime64[D]').astype(np.int32)
+    amount = df_trans['amount'].values.astype(np.float32)
+
+    order = np.lexsort((day, customer))
+    customer, day, amount = customer[order], day[order], amount[order]
+    offsets = np.zeros(len(categories) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(customer, minlength=len(categories)), out=offsets[1:])
+    return TransactionArrays(np.sort(categories), customer, day, amount, offsets)
+
+
+def build_array_cache(cache_dir=CACHE_DIR, csv_path=TRANSACTIONS_CSV, store_path=None):
+    """Materialize customer/day/amount arrays as .npy files for memory-mapping."""
+    store_path = store_path or os.path.join(STORE_DIR, 'transactions')
+    if not os.path.exists(cache_dir):
+        os.makedirs(cache_dir)
+
+    fingerprint = _source_fingerprint(csv_path, store_path)
+    arrays = arrays_from_frame(load_transactions(store_path=store_path, csv_path=csv_path))
+    for name in _ARRAYS:
+        tmp = os.path.join(cache_dir, f'{name}.tmp.npy')
+        np.save(tmp, getattr(arrays, name))
+        os.replace(tmp, os.path.join(cache_dir, f'{name}.npy'))
+    with open(os.path.join(cache_dir, 'meta.json'), 'w') as f:
+        json.dump(dict(fingerprint, n_rows=len(arrays.customer), n_customers=len(arrays.customer_ids)), f, indent=2)
+    return arrays
+
+
+def load_array_cache(cache_dir=CACHE_DIR, mmap_mode='r'):
+    """Memory-map a cache written by build_array_cache (read-only, shared across processes)."""
+    return TransactionArrays(**{
+        name: np.load(os.path.join(cache_dir, f'{name}.npy'), mmap_mode=mmap_mode)
+        for name in _ARRAYS
+    })
+
+
+def get_transaction_arrays(cache_dir=CACHE_DIR, csv_path=TRANSACTIONS_CSV, store_path=None):
+    """Memory-map the cached arrays, rebuilding them first if the source data changed."""
+    store_path = store_path or os.path.join(STORE_DIR, 'transactions')
+    meta_path = os.path.join(cache_dir, 'meta.json')
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+        fingerprint = _source_fingerprint(csv_path, store_path)
+        if all(meta.get(k) == v for k, v in fingerprint.items()):
+            return load_array_cache(cache_dir)
+    build_array_cache(cache_dir, csv_path, store_path)
+    return load_array_cache(cache_dir)
+
+
+def transactions_frame(arrays):
+    """Rebuild the customer_id / transaction_date / amount frame without parsing."""
+    return pd.DataFrame({
+        'customer_id': pd.Categorical.from_codes(arrays.customer, arrays.customer_ids),
+        'transaction_date': np.asarray(arrays.day).astype('datetime64[D]').astype('datetime64[ns]'),
+        'amount': arrays.amount,
+    })
+
+
+if __name__ == "__main__":
+    arrays = build_array_cache()
+    print(f"Cached {len(arrays.customer)} transactions for {len(arrays.customer_ids)} customers in {CACHE_DIR}/")
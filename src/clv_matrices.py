@@ -0,0 +1,121 @@
+import pandas as pd
+import numpy as np
+import hashlib
+import json
+import os
+
+from src.clv_scoring import bgnbd_expected_purchases, bgnbd_p_alive
+from src.model_registry import prune_cache
+
+MATRIX_CACHE_DIR = 'data/cache/matrices'
+# Same eviction as the model registry: by age, then least recently used
+MATRIX_CACHE_LIMITS = {'max_entries': 100, 'max_bytes': 200 << 20, 'max_age_days': 90}
+
+
+def _grid(max_value, n_points):
+    # Integer grid by default (what lifetimes plots), else n evenly spaced points
+    if n_points is None:
+        return np.arange(max_value + 1, dtype=float)
+    return np.linspace(0, max_value, n_points)
+
+
+def _compute(kind, params, max_frequency, max_recency, t, n_frequency, n_recency):
+    frequency = _grid(max_frequency, n_frequency)[None, :]
+    recency = _grid(max_recency, n_recency)[:, None]
+    # Every cell is a customer of age T = max_recency (as in lifetimes)
+    if kind == 'frequency_recency':
+        Z = bgnbd_expected_purchases(params, t, frequency, recency, float(max_recency))
+    elif kind == 'probability_alive':
+        Z = bgnbd_p_alive(params, frequency, recency, float(max_recency))
+    else:
+        raise ValueError(f"Unknown matrix kind {kind!r}")
+    return np.broadcast_to(Z, (recency.shape[0], frequency.shape[1])).astype(np.float32), frequency[0], recency[:, 0]
+
+
+def clv_matrix(kind, params, max_frequency, max_recency, t=1, n_frequency=None, n_recency=None,
+               cache_dir=MATRIX_CACHE_DIR):
+    """(recency x frequency) BG/NBD matrix from one broadcast evaluation, cached on disk.
+
+    ``kind`` is 'frequency_recency' (expected purchases in the next ``t``
+    periods) or 'probability_alive'. Rows are recency, columns frequency,
+    matching lifetimes' plots; ``n_frequency`` / ``n_recency`` set an
+    arbitrary grid resolution. Results are cached under ``cache_dir`` keyed by
+    the fitted parameters and grid spec; hits refresh an entry's mtime and
+    each write prunes the directory to ``MATRIX_CACHE_LIMITS``. Returns
+    (Z, frequencies, recencies).
+    """
+    spec = {'kind': kind, 'params': pd.Series(params, dtype=float).round(12).to_dict(),
+            'max_frequency': int(max_frequency), 'max_recency': int(max_recency), 't': t,
+            'n_frequency': n_frequency, 'n_recency': n_recency}
+    key = hashlib.sha256(json.dumps(spec, sort_keys=True).encode()).hexdigest()[:24]
+    path = os.path.join(cache_dir, f'{kind}-{key}.npz') if cache_dir else None
+    if path and os.path.exists(path):
+        os.utime(path)
+        with np.load(path) as cached:
+            return cached['Z'], cached['frequency'], cached['recency']
+
+    Z, frequency, recency = _compute(kind, params, max_frequency, max_recency, t, n_frequency, n_recency)
+    if path:
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        # Write beside the entry and rename, so concurrent readers never see a partial file
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with open(tmp, 'wb') as f:
+            np.savez(f, Z=Z, frequency=frequency, recency=recency)
+        os.replace(tmp, path)
+        prune_cache(cache_dir, suffix='.npz', **MATRIX_CACHE_LIMITS)
+    return Z, frequency, recency
+
+
+def matrix_frame(Z, frequency, recency):
+    """Matrix as a recency x frequency DataFrame (for notebooks and dashboard exports)."""
+    return pd.DataFrame(Z, index=pd.Index(recency, name='recency'), columns=pd.Index(frequency, name='frequency'))
+
+
+def export_matrices(params, max_frequency, max_recency, output_path, t=1, n_frequency=None, n_recency=None):
+    """Write both matrices in long format (kind, recency, frequency, value) to Parquet or CSV."""
+    frames = []
+    for kind in ('frequency_recency', 'probability_alive'):
+        long = matrix_frame(*clv_matrix(kind, params, max_frequency, max_recency, t, n_frequency, n_recency))
+        frames.append(long.stack().rename('value').reset_index().assign(kind=kind))
+    out = pd.concat(frames, ignore_index=True)[['kind', 'recency', 'frequency', 'value']]
+    if output_path.endswith('.csv'):
+        out.to_csv(output_path, index=False)
+    else:
+        out.to_parquet(output_path, index=False)
+    return out
+
+
+def _plot_matrix(Z, frequency, recency, title, xlabel, ylabel, **kwargs):
+    from matplotlib import pyplot as plt
+
+    ax = plt.subplot(111)
+    # Cell-centred extent so non-integer grids keep frequency/recency units on the axes
+    pcm = ax.imshow(Z, interpolation=kwargs.pop('interpolation', 'none'), aspect='auto',
+                    extent=(frequency[0] - 0.5, frequency[-1] + 0.5, recency[-1] + 0.5, recency[0] - 0.5), **kwargs)
+    plt.xlabel(xlabel)
+    plt.ylabel(ylabel)
+    plt.title(title)
+    plt.colorbar(pcm, ax=ax)
+    return ax
+
+
+def plot_frequency_recency_matrix(params, max_frequency, max_recency, t=1, n_frequency=None, n_recency=None,
+                                  title=None, xlabel="Customer's Historical Frequency",
+                                  ylabel="Customer's Recency", **kwargs):
+    """Drop-in for lifetimes' plot_frequency_recency_matrix, drawn from the cached matrix."""
+    if title is None:
+        title = ('Expected Number of Future Purchases for {} Unit{} of Time,'.format(t, '' if t == 1 else 's')
+                 + '\nby Frequency and Recency of a Customer')
+    Z, frequency, recency = clv_matrix('frequency_recency', params, max_frequency, max_recency, t,
+                                       n_frequency, n_recency)
+    return _plot_matrix(Z, frequency, recency, title, xlabel, ylabel, **kwargs)
+
+
+def plot_probability_alive_matrix(params, max_frequency, max_recency, n_frequency=None, n_recency=None,
+                                  title='Probability Customer is Alive,\nby Frequency and Recency of a Customer',
+                                  xlabel="Customer's Historical Frequency", ylabel="Customer's Recency", **kwargs):
+    """Drop-in for lifetimes' plot_probability_alive_matrix, drawn from the cached matrix."""
+    Z, frequency, recency = clv_matrix('probability_alive', params, max_frequency, max_recency,
+                                       n_frequency=n_frequency, n_recency=n_recency)
+    return _plot_matrix(Z, frequency, recency, title, xlabel, ylabel, **kwargs)
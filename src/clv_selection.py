@@ -0,0 +1,204 @@
+import pandas as pd
+import numpy as np
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import json
+import os
+import time
+
+from lifetimes import ModifiedBetaGeoFitter, ParetoNBDFitter
+from src.clv_fit import compress_bgnbd, bgnbd_fit, gamma_gamma_fit
+from src.clv_scoring import bgnbd_expected_purchases, gamma_gamma_expected_profit
+from src.clv_backtest import CutoffIndex
+from src.model_registry import ModelRegistry, fingerprint
+
+PENALIZER_GRID = (0.0, 0.001, 0.003, 0.01, 0.03, 0.1, 0.3, 1.0)
+TRANSACTION_MODELS = ('bgnbd', 'modified_bgnbd', 'pareto_nbd')
+
+ModelSelection = namedtuple('ModelSelection', ['table', 'best_model', 'best_penalizer', 'best_params',
+                                               'gamma_gamma_penalizer', 'gamma_gamma_params'])
+
+
+def _fit_lifetimes(model, data, penalizer_coef, initial_params):
+    # Warm starts go in the fitters' own parameterization: time-scaled
+    # (max T == 1), log-space for modified BG/NBD, raw for Pareto/NBD
+    patterns = compress_bgnbd(data)
+    scale = 1.0 / patterns['T'].max()
+    if model == 'modified_bgnbd':
+        fitter = ModifiedBetaGeoFitter(penalizer_coef=penalizer_coef)
+        x0 = None if initial_params is None else \
+            np.log(initial_params[['r', 'alpha', 'a', 'b']].values * [1, scale, 1, 1])
+        kwargs = {}
+    else:
+        fitter = ParetoNBDFitter(penalizer_coef=penalizer_coef)
+        # Fixed start instead of lifetimes' random one keeps the search reproducible
+        x0 = np.ones(4) if initial_params is None else \
+            initial_params[['r', 'alpha', 's', 'beta']].values * [1, scale, 1, scale]
+        kwargs = {'fit_method': 'Nelder-Mead'}
+    fitter.fit(patterns['frequency'], patterns['recency'], patterns['T'], weights=patterns['weights'],
+               initial_params=x0, **kwargs)
+    return fitter
+
+
+def _fit_candidate(model, data, penalizer_coef, initial_params):
+    """Fit one grid point; returns (params, converged, predict(t, f, r, T) or None)."""
+    if model == 'bgnbd':
+        fit = bgnbd_fit(data, penalizer_coef=penalizer_coef, initial_params=initial_params)
+        return fit.params, fit.converged, lambda t, f, r, T: bgnbd_expected_purchases(fit.params, t, f, r, T)
+    if model == 'gamma_gamma':
+        fit = gamma_gamma_fit(data, penalizer_coef=penalizer_coef, initial_params=initial_params)
+        return fit.params, fit.converged, None
+    fitter = _fit_lifetimes(model, data, penalizer_coef, initial_params)
+    return fitter.params_, True, fitter.conditional_expected_number_of_purchases_up_to_time
+
+
+def _score(model, data, params, predict, holdout_periods):
+    f, r, T, m = (data[c].values for c in ('frequency', 'recency', 'T', 'monetary_value'))
+    if model == 'gamma_gamma':
+        # Expected spend per purchase vs realized average holdout spend, for
+        # repeat customers who bought in the holdout
+        bought = (f > 0) & (data['frequency_holdout'].values > 0)
+        actual = data['spend_holdout'].values[bought] / data['frequency_holdout'].values[bought]
+        predicted = gamma_gamma_expected_profit(params, f[bought], m[bought])
+        return {'spend_mae': np.abs(predicted - actual).mean(),
+                'spend_bias': predicted.mean() / actual.mean() - 1}
+    actual = data['frequency_holdout'].values
+    predicted = np.asarray(predict(holdout_periods, f, r, T), dtype=float)
+    return {'purchases_mae': np.abs(predicted - actual).mean(),
+            'purchases_rmse': np.sqrt(((predicted - actual) ** 2).mean()),
+            'purchases_bias': predicted.sum() / actual.sum() - 1}
+
+
+def _search_task(args):
+    # One contiguous run of the grid, walked in order so each fit starts
+    # from its neighbour's optimum
+    model, penalizers, data, holdout_periods = args
+    rows, previous = [], None
+    for penalizer_coef in penalizers:
+        start = time.perf_counter()
+        row = {'model': model, 'penalizer_coef': penalizer_coef}
+        try:
+            params, converged, predict = _fit_candidate(model, data, penalizer_coef, previous)
+        except Exception as exc:  # lifetimes raises ConvergenceError (and others) on degenerate fits
+            row.update(converged=False, error=str(exc).strip())
+        else:
+            row.update(_score(model, data, params, predict, holdout_periods), converged=converged,
+                       params=params.to_dict())
+            previous = params
+        row['fit_seconds'] = round(time.perf_counter() - start, 3)
+        rows.append(row)
+    return rows
+
+
+def select_clv_models(arrays, penalizers=PENALIZER_GRID, models=('bgnbd',), holdout_periods=90, freq='D',
+                      repeat_only=False, metric='purchases_rmse', registry=None, n_workers=None):
+    """Holdout-scored sweep of ``penalizer_coef`` for the transaction and Gamma-Gamma models.
+
+    The last ``holdout_periods`` periods of the log are held out (via
+    CutoffIndex). Each transaction model in ``models`` (any of
+    TRANSACTION_MODELS) and Gamma-Gamma is fitted on the calibration summary
+    for every penalizer; transaction models are ranked by ``metric`` on
+    holdout purchases and Gamma-Gamma by ``spend_mae`` on realized average
+    holdout spend. Each model's grid is split into contiguous runs across the
+    process pool and each run is walked in ascending order, warm-starting
+    every fit from the previous optimum; failed fits are kept in the table
+    with ``converged=False``. Warm starts only carry over within a run (the
+    first penalizer of each run starts cold), so with more workers than
+    candidates the optima can differ slightly from a single-run search;
+    ``n_workers <= len(models) + 1`` keeps each grid in one run. RuntimeError
+    is raised, listing the failures, if every fit of a family fails.
+
+    The result is stored in ``registry`` (a ModelRegistry by default) under
+    a fingerprint of the calibration/holdout data, the grid and the search
+    settings, so a rerun on unchanged data skips the search.
+
+    Returns a ModelSelection: the ranked ``table`` (``family`` is
+    'transactions' or 'spend'), the best transaction model with its
+    penalizer and calibration parameters, and the best Gamma-Gamma
+    penalizer and parameters.
+    """
+    index = CutoffIndex(arrays, freq)
+    data = index.calibration_holdout(index.period.max() - holdout_periods, holdout_periods)
+    if repeat_only:
+        data = data[data['frequency'] > 0]
+
+    grid = sorted(float(p) for p in penalizers)
+    candidates = list(models) + ['gamma_gamma']
+    n_workers = n_workers or os.cpu_count()
+    # Enough runs to fill the pool; longer runs get more warm starts
+    n_runs = max(1, min(len(grid), n_workers // len(candidates)))
+
+    registry = registry or ModelRegistry()
+    key = fingerprint(data, 'selection', {'penalizers': grid, 'models': candidates, 'holdout_periods': holdout_periods,
+                                          'freq': freq, 'repeat_only': repeat_only, 'metric': metric,
+                                          'n_runs': n_runs})
+    entry = registry.get(key)
+    if entry is not None:
+        diag = entry['diagnostics']
+        print(f"model selection: cache hit {key[:12]} (skipped search)")
+        return ModelSelection(pd.DataFrame(diag['table']), diag['best_model'], diag['best_penalizer'],
+                              pd.Series(entry['params']), diag['gamma_gamma_penalizer'],
+                              pd.Series(diag['gamma_gamma_params']))
+
+    start = time.perf_counter()
+    tasks = [(model, list(run), data, holdout_periods)
+             for model in candidates for run in np.array_split(grid, n_runs) if len(run)]
+
+    if n_workers == 1:
+        results = [_search_task(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            results = list(pool.map(_search_task, tasks))
+
+    table = pd.DataFrame([row for rows in results for row in rows])
+    table = table.reindex(columns=table.columns.union(['params', 'spend_mae', metric], sort=False))
+    table['family'] = np.where(table['model'] == 'gamma_gamma', 'spend', 'transactions')
+    table['score'] = np.where(table['family'] == 'spend', table['spend_mae'], table[metric])
+    table['rank'] = table.groupby('family')['score'].rank(method='first', na_option='bottom').astype(int)
+    table = table.sort_values(['family', 'rank'], ascending=[False, True]).reset_index(drop=True)
+
+    best, best_spend = (_best(table, family) for family in ('transactions', 'spend'))
+    selection = ModelSelection(table.drop(columns=['params']), best['model'], float(best['penalizer_coef']),
+                               pd.Series(best['params']), float(best_spend['penalizer_coef']),
+                               pd.Series(best_spend['params']))
+    registry.put(key, 'selection', selection.best_params, {
+        'best_model': selection.best_model, 'best_penalizer': selection.best_penalizer,
+        'gamma_gamma_penalizer': selection.gamma_gamma_penalizer,
+        'gamma_gamma_params': selection.gamma_gamma_params.astype(float).to_dict(),
+        'table': json.loads(selection.table.to_json(orient='records')),
+        'search_seconds': round(time.perf_counter() - start, 3),
+    })
+    return selection
+
+
+def _best(table, family):
+    # Top-ranked scored row of a family; RuntimeError with the failures if none
+    scored = table[(table['family'] == family) & table['score'].notna()]
+    if scored.empty:
+        failed = table.loc[table['family'] == family, table.columns.intersection(['model', 'penalizer_coef', 'error'])]
+        raise RuntimeError(f"Every {family} candidate failed to fit:\n{failed.to_string(index=False)}")
+    return scored.iloc[0]
+
+
+if __name__ == "__main__":
+    import argparse
+    from src.array_cache import get_transaction_arrays
+
+    parser = argparse.ArgumentParser(description='Holdout-scored penalizer / model selection for the CLV models.')
+    parser.add_argument('--models', nargs='+', default=['bgnbd'], choices=TRANSACTION_MODELS)
+    parser.add_argument('--penalizers', nargs='+', type=float, default=list(PENALIZER_GRID))
+    parser.add_argument('--holdout', type=int, default=90, help='holdout length in periods')
+    parser.add_argument('--freq', default='D', choices=['D', 'W'])
+    parser.add_argument('--repeat-only', action='store_true', help='fit on repeat customers only')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--output', default=None, help='optional CSV path for the ranked table')
+    args = parser.parse_args()
+
+    selection = select_clv_models(get_transaction_arrays(), args.penalizers, args.models, args.holdout,
+                                  args.freq, args.repeat_only, n_workers=args.workers)
+    with pd.option_context('display.width', 200, 'display.max_columns', None):
+        print(selection.table.round(4))
+    print(f"Best: {selection.best_model} (penalizer_coef={selection.best_penalizer}), "
+          f"gamma_gamma penalizer_coef={selection.gamma_gamma_penalizer}")
+    if args.output:
+        selection.table.to_csv(args.output, index=False)
@@ -0,0 +1,174 @@
+import pandas as pd
+import numpy as np
+import os
+import shutil
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.dataset as ds
+except ImportError:  # loaders fall back to parsing the CSVs
+    pa = None
+
+STORE_DIR = 'data/store'
+TRANSACTIONS_CSV = 'data/transactions.csv'
+MARKETING_CSV = 'data/marketing_spend.csv'
+
+# Typed on-disk layouts. Both tables are hive-partitioned by `month`
+# (yyyymm as int32), so date-range loads only open the matching partitions.
+if pa is not None:
+    TRANSACTIONS_SCHEMA = pa.schema([
+        ('customer_id', pa.dictionary(pa.int32(), pa.string())),
+        ('transaction_date', pa.date32()),
+        ('amount', pa.float32()),
+    ])
+    MARKETING_SCHEMA = pa.schema([
+        ('date', pa.date32()),
+        ('region', pa.dictionary(pa.int32(), pa.string())),
+        ('channel', pa.dictionary(pa.int32(), pa.string())),
+        ('spend', pa.float32()),
+        ('conversions', pa.int32()),
+    ])
+    MONTH_PARTITIONING = ds.partitioning(pa.schema([('month', pa.int32())]), flavor='hive')
+
+DATE_COLUMNS = {'transactions': 'transaction_date', 'marketing': 'date'}
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("The columnar store needs pyarrow: pip install pyarrow")
+
+
+def _with_month(batch, date_col):
+    # yyyymm partition key derived from the date32 column
+    days = batch.column(date_col).cast(pa.int32()).to_numpy(zero_copy_only=False)
+    dates = days.astype('datetime64[D]')
+    years = dates.astype('datetime64[Y]').astype(int) + 1970
+    months = dates.astype('datetime64[M]').astype(int) % 12 + 1
+    return batch.append_column('month', pa.array(years * 100 + months, pa.int32()))
+
+
+def convert_csv_to_store(csv_path, store_path, table='transactions', block_size=64 << 20):
+    """Stream a CSV into a month-partitioned Parquet dataset.
+
+    The CSV is read in ``block_size`` byte blocks, cast to the typed schema
+    and written partition by partition, so files larger than memory convert
+    fine. Columns missing from the CSV (e.g. ``region`` in the national
+    marketing file) are skipped. The dataset is written to a temporary
+    directory beside ``store_path`` and swapped in when complete, so months
+    missing from a re-converted CSV do not linger in the store.
+    """
+    _require_pyarrow()
+    date_col = DATE_COLUMNS[table]
+    full_schema = TRANSACTIONS_SCHEMA if table == 'transactions' else MARKETING_SCHEMA
+
+    with open(csv_path) as f:
+        header = f.readline().strip().split(',')
+    schema = pa.schema([field for field in full_schema if field.name in header])
+    convert = pa_csv.ConvertOptions(
+        column_types={field.name: (field.type.value_type if pa.types.is_dictionary(field.type) else field.type)
+                      for field in schema},
+        include_columns=schema.names,
+    )
+    reader = pa_csv.open_csv(csv_path, read_options=pa_csv.ReadOptions(block_size=block_size),
+                             convert_options=convert)
+
+    def batches():
+        for batch in reader:
+            yield _with_month(batch.cast(schema), date_col)
+
+    tmp_path, old_path = f'{store_path}.tmp', f'{store_path}.old'
+    for path in (tmp_path, old_path):
+        shutil.rmtree(path, ignore_errors=True)
+    ds.write_dataset(
+        batches(), tmp_path, schema=schema.append(pa.field('month', pa.int32())),
+        format='parquet', partitioning=MONTH_PARTITIONING, max_rows_per_group=1 << 20,
+    )
+    if os.path.exists(store_path):
+        os.replace(store_path, old_path)
+    os.replace(tmp_path, store_path)
+    shutil.rmtree(old_path, ignore_errors=True)
+    return store_path
+
+
+def _month_key(ts):
+    return ts.year * 100 + ts.month
+
+
+def _load_store(store_path, date_col, start, end, columns):
+    dataset = ds.dataset(store_path, format='parquet', partitioning=MONTH_PARTITIONING)
+    flt = None
+    if start is not None:
+        start = pd.Timestamp(start)
+        flt = (ds.field('month') >= _month_key(start)) & (ds.field(date_col) >= pa.scalar(start.date()))
+    if end is not None:
+        end = pd.Timestamp(end)
+        end_flt = (ds.field('month') <= _month_key(end)) & (ds.field(date_col) <= pa.scalar(end.date()))
+        flt = end_flt if flt is None else flt & end_flt
+    names = [c for c in dataset.schema.names if c != 'month']
+    columns = names if columns is None else list(columns)
+    table = dataset.to_table(columns=columns, filter=flt)
+    df = table.to_pandas(date_as_object=False)
+    # Partitions are read in directory order; restore chronological order
+    if date_col in df.columns:
+        df = df.sort_values(date_col, kind='stable', ignore_index=True)
+    return df
+
+
+def _load_csv(csv_path, date_col, start, end, columns, categoricals):
+    usecols = None if columns is None else list(dict.fromkeys(list(columns) + [date_col]))
+    df = pd.read_csv(csv_path, usecols=usecols, parse_dates=[date_col])
+    if start is not None:
+        df = df[df[date_col] >= pd.Timestamp(start)]
+    if end is not None:
+        df = df[df[date_col] <= pd.Timestamp(end)]
+    df = df.reset_index(drop=True)
+    if columns is not None:
+        df = df[list(columns)]
+    for col in categoricals:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+    return df
+
+
+def load_transactions(start=None, end=None, columns=None, store_path=None, csv_path=TRANSACTIONS_CSV):
+    """Load transactions between ``start`` and ``end`` (inclusive).
+
+    Reads only the month partitions and columns requested from the Parquet
+    store when it exists, else parses ``csv_path``. ``customer_id`` comes
+    back as a categorical and ``amount`` as float32 in both cases.
+    """
+    store_path = store_path or os.path.join(STORE_DIR, 'transactions')
+    if pa is not None and os.path.isdir(store_path):
+        df = _load_store(store_path, 'transaction_date', start, end, columns)
+    else:
+        df = _load_csv(csv_path, 'transaction_date', start, end, columns, ['customer_id'])
+    if 'amount' in df.columns:
+        df['amount'] = df['amount'].astype(np.float32)
+    return df
+
+
+def load_marketing(start=None, end=None, columns=None, store_path=None, csv_path=MARKETING_CSV):
+    """Load marketing spend between ``start`` and ``end`` (inclusive); see ``load_transactions``."""
+    store_path = store_path or os.path.join(STORE_DIR, 'marketing')
+    if pa is not None and os.path.isdir(store_path):
+        return _load_store(store_path, 'date', start, end, columns)
+    return _load_csv(csv_path, 'date', start, end, columns, ['channel', 'region'])
+
+
+def build_store(store_dir=STORE_DIR, transactions_csv=TRANSACTIONS_CSV, marketing_csv=MARKETING_CSV):
+    """Convert both project CSVs into ``store_dir`` (one command)."""
+    for table, csv_path in (('transactions', transactions_csv), ('marketing', marketing_csv)):
+        path = convert_csv_to_store(csv_path, os.path.join(store_dir, table), table)
+        print(f"Converted {csv_path} -> {path}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Convert the project CSVs into the partitioned Parquet store.')
+    parser.add_argument('--store', default=STORE_DIR)
+    parser.add_argument('--transactions', default=TRANSACTIONS_CSV)
+    parser.add_argument('--marketing', default=MARKETING_CSV)
+    args = parser.parse_args()
+    build_store(args.store, args.transactions, args.marketing)
@@ -1,7 +1,15 @@
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
+import json
 import os
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:  # pandas writer is used instead (slower on large batches)
+    pa = None
 
 def generate_synthetic_data(output_dir='data'):
     if not os.path.exists(output_dir):
@@ -63,5 +71,261 @@ def generate_synthetic_data(output_dir='data'):
     df_mmm.to_csv(f'{output_dir}/marketing_spend.csv', index=False)
     print(f"Generated {len(df_mmm)} marketing records.")
 
+
+def _simulate_transaction_batch(rng, first_customer, n_customers, start_date, end_date, block=16):
+    # Per-customer traits, drawn as whole arrays (same distributions as above)
+    freq_lambda = rng.gamma(2, 0.5, n_customers)
+    avg_spend = rng.normal(50, 15, n_customers)
+    horizon = (end_date - start_date).days
+    first_day = rng.integers(0, 365, n_customers)
+
+    # Draw inter-purchase gaps a block at a time; only customers whose
+    # cumulative date is still inside the window get another block.
+    cust_parts, day_parts = [np.arange(n_customers)], [first_day]
+    active = np.arange(n_customers)
+    last_day = first_day.astype(np.int64)
+    while active.size:
+        scale = (30 / freq_lambda[active])[:, None]
+        gaps = np.maximum(1, (rng.exponential(1.0, (active.size, block)) * scale).astype(np.int64))
+        days = last_day[:, None] + np.cumsum(gaps, axis=1)
+        inside = days <= horizon
+        rows, cols = np.nonzero(inside)
+        cust_parts.append(active[rows])
+        day_parts.append(days[rows, cols])
+        still = inside[:, -1]
+        active, last_day = active[still], days[still, -1]
+
+    cust = np.concatenate(cust_parts)
+    day = np.concatenate(day_parts)
+    order = np.argsort(cust, kind='stable')
+    cust, day = cust[order], day[order]
+
+    spend = avg_spend[cust]
+    amount = np.maximum(5, spend + rng.standard_normal(cust.size) * spend * 0.2)
+    # Anomaly injection: 1% chance of a massive bulk purchase
+    amount[rng.random(cust.size) < 0.01] *= 10
+
+    # Categoricals keep the ID/date strings to one copy per customer/day
+    ids = [f'CUST_{i:04d}' for i in range(first_customer, first_customer + n_customers)]
+    calendar = np.datetime64(start_date.date(), 'D') + np.arange(horizon + 1)
+    return pd.DataFrame({
+        'customer_id': pd.Categorical.from_codes(cust, ids),
+        'transaction_date': pd.Categorical.from_codes(day, calendar.astype(str)),
+        'amount': amount,
+    })
+
+
+def _write_csv_batch(df, path, first):
+    # pyarrow formats floats ~10x faster than DataFrame.to_csv
+    if pa is None:
+        df.to_csv(path, mode='w' if first else 'a', header=first, index=False)
+        return
+    options = pa_csv.WriteOptions(include_header=False, quoting_style='none')
+    with open(path, 'wb' if first else 'ab') as f:
+        if first:
+            f.write((','.join(df.columns) + '\n').encode())
+        pa_csv.write_csv(pa.Table.from_pandas(df, preserve_index=False), f, options)
+
+
+def _shard_rng(seed, shard):
+    # Independent stream per shard, derived from the root seed only; equal to
+    # SeedSequence(seed).spawn(n)[shard] for any n > shard.
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(shard,)))
+
+
+def _generate_shard(args):
+    shard, first, n, seed, start_date, end_date, output_dir = args
+    path = os.path.join(output_dir, f'transactions-{shard:05d}.csv')
+    batch = _simulate_transaction_batch(_shard_rng(seed, shard), first, n, start_date, end_date)
+    _write_csv_batch(batch, path, True)
+    return path, len(batch)
+
+
+def generate_transactions_vectorized(n_customers=10_000_000, output_path='data/transactions.csv',
+                                     batch_size=250_000, seed=42,
+                                     start_date=datetime(2023, 1, 1), end_date=datetime(2024, 12, 31)):
+    """Vectorized transaction generator for load tests.
+
+    Customers are simulated in batches of ``batch_size`` and every batch is
+    appended to ``output_path`` before the next one is drawn, so memory is
+    bounded by the batch rather than the full dataset. The output schema is
+    the same as ``generate_synthetic_data`` (customer_id, transaction_date,
+    amount); the random stream differs from the scalar loop. Each batch
+    uses the same per-shard generator as ``generate_transactions_sharded``,
+    so both modes produce identical rows for the same seed and batch size.
+    """
+    out_dir = os.path.dirname(output_path)
+    if out_dir and not os.path.exists(out_dir):
+        os.makedirs(out_dir)
+
+    n_rows = 0
+    for shard, first in enumerate(range(0, n_customers, batch_size)):
+        batch = _simulate_transaction_batch(
+            _shard_rng(seed, shard), first, min(batch_size, n_customers - first), start_date, end_date
+        )
+        _write_csv_batch(batch, output_path, first == 0)
+        n_rows += len(batch)
+    print(f"Generated {n_rows} transactions for {n_customers} customers.")
+    return n_rows
+
+
+def generate_transactions_sharded(n_customers=10_000_000, output_dir='data/transactions_shards',
+                                  shard_size=250_000, seed=42, n_workers=None,
+                                  start_date=datetime(2023, 1, 1), end_date=datetime(2024, 12, 31)):
+    """Generate transactions as one CSV per shard across a process pool.
+
+    The customer ID space is cut into fixed shards of ``shard_size`` and each
+    shard draws from its own generator spawned from ``seed``. Shard contents
+    depend only on (seed, shard_size), never on ``n_workers``, so the files
+    are bit-identical however many processes run the job. Returns the shard
+    paths in customer order.
+    """
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    tasks = [
+        (shard, first, min(shard_size, n_customers - first), seed, start_date, end_date, output_dir)
+        for shard, first in enumerate(range(0, n_customers, shard_size))
+    ]
+    with ProcessPoolExecutor(max_workers=n_workers) as pool:
+        results = list(pool.map(_generate_shard, tasks))
+
+    print(f"Generated {sum(n for _, n in results)} transactions for {n_customers} customers "
+          f"in {len(results)} shards.")
+    return [path for path, _ in results]
+
+
+# True per-channel media parameters for the geo MMM generator: geometric
+# adstock decay, Hill saturation (half-saturation as a multiple of the
+# channel's steady-state adstocked spend, and shape) and max effect per period.
+DEFAULT_CHANNEL_PARAMS = {
+    'Search': {'base_spend': 3000, 'decay': 0.1, 'half_saturation': 0.8, 'shape': 1.2, 'beta': 2400},
+    'Social': {'base_spend': 2500, 'decay': 0.4, 'half_saturation': 1.0, 'shape': 1.5, 'beta': 1500},
+    'TV': {'base_spend': 4500, 'decay': 0.8, 'half_saturation': 1.5, 'shape': 2.0, 'beta': 2000},
+    'Email': {'base_spend': 1500, 'decay': 0.2, 'half_saturation': 0.6, 'shape': 1.0, 'beta': 1200},
+}
+
+
+def _random_channel_params(rng, n_channels):
+    return {
+        f'Channel_{i:02d}': {
+            'base_spend': float(rng.uniform(500, 5000)),
+            'decay': float(rng.uniform(0.05, 0.9)),
+            'half_saturation': float(rng.uniform(0.5, 2.0)),
+            'shape': float(rng.uniform(0.8, 2.5)),
+            'beta': float(rng.uniform(300, 3000)),
+        } for i in range(n_channels)
+    }
+
+
+def generate_marketing_vectorized(n_regions=200, channel_params=None, n_channels=None, freq='D',
+                                  output_path='data/marketing_spend_geo.csv', seed=42,
+                                  start_date=datetime(2023, 1, 1), end_date=datetime(2024, 12, 31)):
+    """Vectorized geo x channel x date marketing generator for MMM stress tests.
+
+    Spend is drawn for the whole (date, region, channel) cube at once, carried
+    over with each channel's true geometric adstock, passed through a Hill
+    saturation curve and scaled by seasonality and region size before Poisson
+    noise. ``channel_params`` overrides ``DEFAULT_CHANNEL_PARAMS``; with
+    ``n_channels`` random parameters are drawn instead. The ground truth is
+    written next to the CSV as ``<output>.truth.json`` so fitted MMM
+    parameters can be scored against it. Output columns: date, region,
+    channel, spend, conversions.
+    """
+    out_dir = os.path.dirname(output_path)
+    if out_dir and not os.path.exists(out_dir):
+        os.makedirs(out_dir)
+
+    rng = np.random.default_rng(seed)
+    if channel_params is None:
+        channel_params = _random_channel_params(rng, n_channels) if n_channels else DEFAULT_CHANNEL_PARAMS
+    channels = list(channel_params)
+    param = {k: np.array([channel_params[ch][k] for ch in channels], dtype=float)
+             for k in ('base_spend', 'decay', 'half_saturation', 'shape', 'beta')}
+
+    dates = pd.date_range(start_date, end_date, freq=freq)
+    regions = [f'REGION_{i:03d}' for i in range(n_regions)]
+    region_scale = rng.lognormal(0, 0.5, n_regions)
+    n_dates, n_channels = len(dates), len(channels)
+
+    # 1. Spend cube (date x region x channel)
+    spend = (param['base_spend'] * region_scale[:, None]) * rng.uniform(0.5, 1.5, (n_dates, n_regions, n_channels))
+
+    # 2. True geometric adstock, one vectorized step per date
+    adstock = np.empty_like(spend)
+    adstock[0] = spend[0]
+    for t in range(1, n_dates):
+        adstock[t] = spend[t] + param['decay'] * adstock[t - 1]
+
+    # 3. Hill saturation, seasonality and region size
+    half_sat = param['half_saturation'] * param['base_spend'] / (1 - param['decay'])
+    ratio = adstock / (half_sat * region_scale[:, None])
+    saturation = ratio ** param['shape'] / (1 + ratio ** param['shape'])
+    seasonality = 1 + 0.2 * np.sin(dates.month.values * (np.pi / 6))
+    expected = param['beta'] * saturation * region_scale[:, None] * seasonality[:, None, None]
+    conversions = rng.poisson(expected)
+
+    df_mmm = pd.DataFrame({
+        'date': pd.Categorical.from_codes(np.repeat(np.arange(n_dates), n_regions * n_channels),
+                                          dates.strftime('%Y-%m-%d')),
+        'region': pd.Categorical.from_codes(np.tile(np.repeat(np.arange(n_regions), n_channels), n_dates), regions),
+        'channel': pd.Categorical.from_codes(np.tile(np.arange(n_channels), n_dates * n_regions), channels),
+        'spend': spend.ravel(),
+        'conversions': conversions.ravel(),
+    })
+    _write_csv_batch(df_mmm, output_path, True)
+
+    truth = {
+        'seed': seed,
+        'freq': freq,
+        'n_regions': n_regions,
+        'seasonality': '1 + 0.2 * sin(month * pi / 6)',
+        'saturation': 'hill: x**shape / (x**shape + K**shape), K = half_saturation_abs * region_scale',
+        'channels': {
+            ch: dict(channel_params[ch], half_saturation_abs=float(half_sat[i]))
+            for i, ch in enumerate(channels)
+        },
+        'region_scale': dict(zip(regions, region_scale.round(6).tolist())),
+    }
+    with open(f'{output_path}.truth.json', 'w') as f:
+        json.dump(truth, f, indent=2)
+    print(f"Generated {len(df_mmm)} marketing records ({n_dates} dates x {n_regions} regions x {n_channels} channels).")
+    return df_mmm
+
+
 if __name__ == "__main__":
-    generate_synthetic_data()
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Generate synthetic transactions and marketing spend.')
+    parser.add_argument('--vectorized', action='store_true',
+                        help='use the batched NumPy transaction generator (large load tests)')
+    parser.add_argument('--shards', action='store_true',
+                        help='write one file per shard of --batch-size customers across a process pool '
+                             '(--output is then a directory, default data/transactions_shards)')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--marketing', action='store_true',
+                        help='generate the geo x channel x date marketing cube instead of transactions')
+    parser.add_argument('--regions', type=int, default=200)
+    parser.add_argument('--channels', type=int, default=None,
+                        help='number of random channels (default: Search, Social, TV, Email)')
+    parser.add_argument('--freq', default='D')
+    parser.add_argument('--customers', type=int, default=10_000_000)
+    parser.add_argument('--batch-size', type=int, default=250_000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default=None,
+                        help='default data/transactions.csv, data/transactions_shards with --shards, '
+                             'data/marketing_spend_geo.csv with --marketing')
+    args = parser.parse_args()
+
+    if args.output is None:
+        args.output = ('data/marketing_spend_geo.csv' if args.marketing else
+                       'data/transactions_shards' if args.shards else 'data/transactions.csv')
+    if args.marketing:
+        generate_marketing_vectorized(args.regions, n_channels=args.channels, freq=args.freq,
+                                      output_path=args.output, seed=args.seed)
+    elif args.shards:
+        generate_transactions_sharded(args.customers, args.output, args.batch_size, args.seed, args.workers)
+    elif args.vectorized:
+        generate_transactions_vectorized(args.customers, args.output, args.batch_size, args.seed)
+    else:
+        generate_synthetic_data()
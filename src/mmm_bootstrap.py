@@ -0,0 +1,153 @@
+import pandas as pd
+import numpy as np
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from multiprocessing import shared_memory
+import os
+
+from src.mmm_search import SATURATIONS
+
+BootstrapResult = namedtuple('BootstrapResult', ['draws', 'intervals', 'roi_intervals'])
+
+# Design/target block shared with the pool workers (set by _attach)
+_SHARED = {}
+
+
+def _chunk_rng(seed, chunk):
+    # Independent stream per chunk derived from the root seed only, so results
+    # don't depend on the number of workers
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(chunk,)))
+
+
+def _attach(name, shape):
+    block = shared_memory.SharedMemory(name=name)
+    _SHARED['block'] = block
+    _SHARED['data'] = np.ndarray(shape, dtype=np.float64, buffer=block.buf)
+
+
+def block_indices(n_time, n_draws, block_length, rng):
+    """(n_draws x n_time) moving-block resample of row indices: random blocks of consecutive weeks."""
+    n_blocks = -(-n_time // block_length)
+    starts = rng.integers(0, n_time - block_length + 1, size=(n_draws, n_blocks))
+    rows = (starts[:, :, None] + np.arange(block_length)).reshape(n_draws, -1)
+    return rows[:, :n_time]
+
+
+def solve_resamples(data, rows):
+    """OLS coefficients (intercept first) for every resample in ``rows`` with one batched solve.
+
+    ``data`` is the (time x (channels + 1)) block [design, target]; each
+    resample is centered so the intercept drops out of the normal equations.
+    """
+    sample = data[rows]
+    means = sample.mean(axis=1, keepdims=True)
+    centered = sample - means
+    x, y = centered[..., :-1], centered[..., -1]
+    xtx = np.einsum('btc,btd->bcd', x, x)
+    xty = np.einsum('btc,bt->bc', x, y)
+    ridge = 1e-12 * np.trace(xtx, axis1=1, axis2=2)[:, None, None] * np.eye(x.shape[-1])
+    coef = np.linalg.solve(xtx + ridge, xty[..., None])[..., 0]
+    intercept = means[:, 0, -1] - (means[:, 0, :-1] * coef).sum(axis=1)
+    return np.column_stack([intercept, coef])
+
+
+def _bootstrap_task(args):
+    chunk, n_draws, block_length, seed = args
+    data = _SHARED['data']
+    rows = block_indices(len(data), n_draws, block_length, _chunk_rng(seed, chunk))
+    return chunk, solve_resamples(data, rows)
+
+
+def _intervals(draws, point, ci):
+    tail = (1 - ci) / 2
+    return pd.DataFrame({'coef': point, 'std': draws.std(axis=0, ddof=1),
+                         'lower': np.quantile(draws, tail, axis=0),
+                         'upper': np.quantile(draws, 1 - tail, axis=0)}, index=draws.columns)
+
+
+def bootstrap_mmm(design, target, spend=None, n_boot=1000, block_length=None, ci=0.95, seed=42, chunk_size=250,
+                  n_workers=None):
+    """Moving-block bootstrap intervals for the MMM regression of ``target`` on ``design``.
+
+    ``design`` is the (time x channels) transformed spend the model is fitted
+    on (e.g. ``decay_grid_search(...).design``). Each resample draws blocks
+    of ``block_length`` consecutive weeks (default ~T^(1/3)) so
+    autocorrelation within a block is kept. The design and target are
+    placed in one shared-memory block that the pool workers attach to; each
+    chunk of ``chunk_size`` resamples has its own seed stream (reproducible
+    for a fixed ``seed`` regardless of ``n_workers``) and is solved with one
+    batched normal-equation solve.
+
+    Returns a BootstrapResult: ``draws`` (resample x [intercept, channels]),
+    ``intervals`` per channel (point ``coef``, ``std``, ``lower``, ``upper``
+    at level ``ci``) and, when raw ``spend`` (time x channels) is given,
+    ``roi_intervals`` of conversions per unit spend
+    (coef x total design / total spend).
+    """
+    channels = list(design.columns)
+    n_time = len(design)
+    data = np.column_stack([design.to_numpy(dtype=float), np.asarray(target, dtype=float)])
+    block_length = block_length or max(1, round(n_time ** (1 / 3)))
+    point = solve_resamples(data, np.arange(n_time)[None, :])[0]
+
+    chunks = [(chunk, min(chunk_size, n_boot - start), block_length, seed)
+              for chunk, start in enumerate(range(0, n_boot, chunk_size))]
+    draws = np.empty((n_boot, data.shape[1]))
+
+    def store(result):
+        chunk, coef = result
+        draws[chunk * chunk_size:chunk * chunk_size + len(coef)] = coef
+
+    if n_workers == 1 or len(chunks) == 1:
+        _SHARED['data'] = data
+        for task in chunks:
+            store(_bootstrap_task(task))
+    else:
+        n_workers = n_workers or os.cpu_count()
+        block = shared_memory.SharedMemory(create=True, size=data.nbytes)
+        try:
+            np.ndarray(data.shape, dtype=np.float64, buffer=block.buf)[:] = data
+            with ProcessPoolExecutor(max_workers=n_workers, initializer=_attach,
+                                     initargs=(block.name, data.shape)) as pool:
+                pending = set()
+                for task in chunks:
+                    if len(pending) >= 2 * n_workers:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            store(future.result())
+                    pending.add(pool.submit(_bootstrap_task, task))
+                for future in pending:
+                    store(future.result())
+        finally:
+            block.close()
+            block.unlink()
+    _SHARED.pop('data', None)
+
+    draws = pd.DataFrame(draws, columns=['intercept'] + channels)
+    intervals = _intervals(draws[channels], point[1:], ci)
+    roi_intervals = None
+    if spend is not None:
+        per_unit = design.sum().values / np.asarray(spend[channels].sum(), dtype=float)
+        roi_intervals = _intervals(draws[channels] * per_unit, point[1:] * per_unit, ci)
+    return BootstrapResult(draws, intervals, roi_intervals)
+
+
+def response_band(result, search, channel, spend, ci=0.95):
+    """Modelled target against weekly ``spend`` on ``channel``, other channels at their mean.
+
+    ``search`` is the DecaySearch whose ``design`` was bootstrapped; spend
+    is mapped through the channel's saturation at its steady-state adstock
+    (``spend / (1 - decay)``, i.e. that spend sustained every week). Uses
+    the bootstrap ``draws``, so saturation plots get their band without
+    resampling again. Returns a frame indexed by ``spend`` with ``mean``,
+    ``lower`` and ``upper``.
+    """
+    draws, design = result.draws, search.design
+    decay, saturation = search.table.loc[channel, ['decay', 'saturation']]
+    x = SATURATIONS[saturation](np.asarray(spend, dtype=float) / (1 - decay))
+    others = [c for c in design.columns if c != channel]
+    base = draws['intercept'].values + draws[others].values @ design[others].mean().values
+    curves = base[:, None] + draws[channel].values[:, None] * x[None, :]
+    tail = (1 - ci) / 2
+    return pd.DataFrame({'mean': curves.mean(axis=0), 'lower': np.quantile(curves, tail, axis=0),
+                         'upper': np.quantile(curves, 1 - tail, axis=0)}, index=pd.Index(spend, name=channel))
@@ -0,0 +1,274 @@
+import pandas as pd
+import numpy as np
+from scipy.optimize import minimize
+
+from src.adstock import geometric_adstock
+
+HILL_PARAMS = ['beta', 'half_saturation', 'shape']
+
+
+def apply_geometric_adstock(spend, alpha):
+    """Geometric adstock with carryover ``alpha`` (scalar or one per channel column)."""
+    return geometric_adstock(spend, alpha)
+
+
+def hill(x, beta, half_saturation, shape):
+    """Hill response ``beta * x**shape / (x**shape + half_saturation**shape)``."""
+    ratio = np.maximum(x, 0) / half_saturation
+    powered = ratio ** shape
+    return beta * powered / (1 + powered)
+
+
+def hill_marginal(x, beta, half_saturation, shape):
+    """Closed-form derivative of ``hill`` with respect to ``x``."""
+    x = np.maximum(x, 1e-12)
+    powered = (x / half_saturation) ** shape
+    return beta * shape * powered / (x * (1 + powered) ** 2)
+
+
+def _hull_tangent(lower, upper, curve, n_iter=50):
+    # Where each curve's concave hull on [lower, upper] rejoins the curve: the
+    # point past the inflection whose tangent passes through (lower,
+    # f(lower)); ``upper`` if the curve is still convex there, ``lower`` if
+    # it is concave throughout
+    beta, half, shape = curve
+    inflection = half * (np.maximum(shape - 1, 0) / (shape + 1)) ** (1 / shape)
+    base = hill(lower, *curve)
+    gap = lambda x: hill(x, *curve) - base - hill_marginal(x, *curve) * (x - lower)
+    lo, hi = np.clip(inflection, lower, upper), upper
+    for _ in range(n_iter):
+        mid = 0.5 * (lo + hi)
+        below = gap(mid) < 0
+        lo, hi = np.where(below, mid, lo), np.where(below, hi, mid)
+    return np.where(gap(upper) <= 0, upper, hi)
+
+
+def _spend_at_level(level, lower, upper, tangent, hull_slope, curve, n_iter=40):
+    # Spend maximizing f(x) - level * x on each concave hull: ``lower`` when
+    # the hull's first slope is below ``level``, else where the falling
+    # marginal past the tangent point meets it (capped at ``upper``)
+    lo, hi = tangent, upper
+    for _ in range(n_iter):
+        mid = 0.5 * (lo + hi)
+        ok = hill_marginal(mid, *curve) >= level
+        lo, hi = np.where(ok, mid, lo), np.where(ok, hi, mid)
+    spend = np.where(hill_marginal(upper, *curve) >= level, upper, lo)
+    return np.where(hull_slope >= level, spend, lower)
+
+
+def _per_channel(value, channels, default):
+    # Scalar or {channel: value} (missing channels get ``default``) -> array
+    if isinstance(value, dict):
+        return np.array([value.get(ch, default) for ch in channels], dtype=float)
+    return np.full(len(channels), value, dtype=float)
+
+
+def fit_hill_curves(x, y, max_iter=200, tol=1e-10):
+    """Least-squares Hill fits for every column of (time x channels) ``x``/``y`` at once.
+
+    Batched Levenberg-Marquardt in log-parameter space: each iteration
+    builds all channels' 3x3 normal equations with one einsum and solves
+    them together, with a damping factor per channel. Half-saturation is
+    kept within 1e-3..1e3 times the largest spend and the shape within
+    0.3..5 so near-linear channels stay finite. Returns a (channels x 3)
+    array of (beta, half_saturation, shape).
+    """
+    x, y = np.atleast_2d(np.asarray(x, dtype=float).T).T, np.atleast_2d(np.asarray(y, dtype=float).T).T
+    scale_x, scale_y = np.maximum(x.max(axis=0), 1e-12), np.maximum(np.abs(y).max(axis=0), 1e-12)
+    xs, ys = x / scale_x, y / scale_y
+    lower = np.log([1e-6, 1e-3, 0.3])
+    upper = np.log([1e6, 1e3, 5.0])
+
+    def residuals(theta):
+        beta, half, shape = np.exp(theta).T[:, None, :]
+        ratio = np.maximum(xs, 1e-300) / half
+        powered = ratio ** shape
+        sat = powered / (1 + powered)
+        pred = beta * sat
+        # d pred / d log(param): beta -> pred; half -> -shape*beta*sat*(1-sat);
+        # shape -> beta*sat*(1-sat)*shape*log(ratio)
+        common = beta * sat * (1 - sat) * shape
+        jac = np.stack([pred, -common, common * np.log(ratio)], axis=-1)
+        return ys - pred, jac
+
+    n_channels = x.shape[1]
+    theta = np.column_stack([np.log(2 * ys.max(axis=0) + 1e-12), np.log(np.median(xs, axis=0) + 1e-12),
+                             np.zeros(n_channels)])
+    theta = np.clip(theta, lower, upper)
+    damping = np.full(n_channels, 1e-3)
+    done = np.zeros(n_channels, dtype=bool)
+    resid, jac = residuals(theta)
+    sse = (resid ** 2).sum(axis=0)
+    for _ in range(max_iter):
+        jtj = np.einsum('tci,tcj->cij', jac, jac)
+        jtr = np.einsum('tci,tc->ci', jac, resid)
+        lhs = jtj + damping[:, None, None] * (np.eye(3) * np.diagonal(jtj, axis1=1, axis2=2)[:, None, :] + 1e-12 * np.eye(3))
+        step = np.linalg.solve(lhs, jtr[..., None])[..., 0]
+        candidate = np.clip(theta + step, lower, upper)
+        new_resid, new_jac = residuals(candidate)
+        new_sse = (new_resid ** 2).sum(axis=0)
+        # Converged channels are frozen, so a channel's fit does not depend
+        # on which other channels share the batch
+        better = (new_sse < sse) & ~done
+        improvement = (sse - new_sse) / np.maximum(sse, 1e-300)
+        theta[better] = candidate[better]
+        resid[:, better], jac[:, better] = new_resid[:, better], new_jac[:, better]
+        sse = np.where(better, new_sse, sse)
+        damping = np.where(better, damping / 3, damping * 4)
+        done |= (better & (improvement < tol)) | (damping > 1e8)
+        if done.all():
+            break
+
+    params = np.exp(theta)
+    params[:, 0] *= scale_y
+    params[:, 1] *= scale_x
+    return params
+
+
+class MMMEngine:
+    """Per-channel Hill saturation curves with budget optimization.
+
+    Curves are stored as arrays of ``HILL_PARAMS`` in ``params`` (one row per
+    channel), so responses for any set of channels and spend levels come
+    from one broadcast evaluation.
+    """
+
+    def __init__(self):
+        self.params = pd.DataFrame(columns=HILL_PARAMS, dtype=float)
+
+    @property
+    def channels(self):
+        return list(self.params.index)
+
+    def fit(self, spend, conversions, channels=None):
+        """Fit every channel's curve at once from (time x channels) adstocked spend and conversions.
+
+        Frames use their columns as channel names; arrays need ``channels``.
+        """
+        if channels is None:
+            channels = list(spend.columns)
+        fitted = fit_hill_curves(np.asarray(spend), np.asarray(conversions))
+        for channel, values in zip(channels, fitted):
+            self.params.loc[channel] = values
+        return self
+
+    def fit_channel(self, spend, conversions, channel):
+        """Fit one channel's curve (see ``fit`` to fit many channels together)."""
+        return self.fit(np.asarray(spend)[:, None], np.asarray(conversions)[:, None], [channel])
+
+    def _curve(self, channel):
+        # One channel -> scalars; a list of channels -> (channels,) arrays
+        return self.params.loc[channel, HILL_PARAMS].to_numpy(dtype=float).T
+
+    def predict_response(self, channel, spend):
+        """Modelled conversions at ``spend`` for one channel or a list of channels.
+
+        For a list of channels the curve parameters run along the last axis,
+        so ``predict_response(channels, x[:, None])`` gives a
+        (len(x), len(channels)) array in one call.
+        """
+        return hill(np.asarray(spend, dtype=float), *self._curve(channel))
+
+    def marginal_response(self, channel, spend):
+        """d response / d spend, broadcasting like ``predict_response``."""
+        return hill_marginal(np.asarray(spend, dtype=float), *self._curve(channel))
+
+    def elasticity(self, channel, spend):
+        """d log response / d log spend (``shape * (1 - saturation)`` for a Hill curve)."""
+        beta, half, shape = self._curve(channel)
+        powered = (np.maximum(np.asarray(spend, dtype=float), 0) / half) ** shape
+        return shape / (1 + powered)
+
+    def optimize_budget(self, total_budget, avg_spends, lower=0.5, upper=2.0, initial_alloc=None):
+        """Reallocate ``total_budget`` across channels to maximize total modelled response.
+
+        ``avg_spends`` maps channel -> current spend; each channel stays
+        within ``lower``..``upper`` times its current spend. Solved with
+        SLSQP on the analytic marginal responses, starting from
+        ``initial_alloc`` (channel -> spend, rescaled to the budget) or the
+        current mix. Returns (new_alloc, elasticities) dicts, elasticities at
+        current spend. Raises ValueError for a budget outside ``lower``..
+        ``upper`` times the current total (no allocation can meet it) and
+        RuntimeError when the solver does not converge to one that does.
+        """
+        channels = list(avg_spends)
+        current = np.array([avg_spends[ch] for ch in channels], dtype=float)
+        low, high = lower * current.sum(), upper * current.sum()
+        if not low * (1 - 1e-9) <= total_budget <= high * (1 + 1e-9):
+            raise ValueError(f"total_budget {total_budget:,.2f} is infeasible: with each channel at {lower}x-{upper}x "
+                             f"of current spend the total must be within {low:,.2f}..{high:,.2f}")
+        scale = max(total_budget, 1e-12)
+
+        def objective(shares):
+            spend = shares * scale
+            return (-self.predict_response(channels, spend).sum() / scale,
+                    -self.marginal_response(channels, spend))
+
+        start = current if initial_alloc is None else np.array([initial_alloc[ch] for ch in channels], dtype=float)
+        bounds = list(zip(lower * current / scale, np.minimum(upper * current, total_budget) / scale))
+        x0 = np.clip(start * (total_budget / start.sum()) / scale, *np.array(bounds).T)
+        result = minimize(objective, x0, jac=True, method='SLSQP', bounds=bounds,
+                          constraints=[{'type': 'eq', 'fun': lambda s: s.sum() - 1, 'jac': lambda s: np.ones_like(s)}],
+                          options={'ftol': 1e-12, 'maxiter': 500})
+        if not result.success or abs(result.x.sum() - 1) > 1e-6:
+            raise RuntimeError(f"budget optimization for {total_budget:,.2f} failed: {result.message} "
+                               f"(allocated {result.x.sum() * scale:,.2f})")
+        new_alloc = dict(zip(channels, result.x * scale))
+        elasticities = dict(zip(channels, self.elasticity(channels, current)))
+        return new_alloc, elasticities
+
+    def budget_frontier(self, avg_spends, fractions=None, min_spend=0.0, max_spend=np.inf):
+        """Optimal allocation and modelled conversions over a range of total budgets.
+
+        Budgets are ``fractions`` (default 50%..200% in 5% steps) of the
+        current total in ``avg_spends``; ``min_spend`` / ``max_spend`` are
+        per-channel bounds (scalar or dict). All budgets are solved together
+        by equalizing marginal ROI on each curve's concave hull: a bisection
+        on the common ROI per budget, with each channel's spend at that ROI
+        from the closed-form Hill gradient. S-shaped channels are either left
+        at their minimum or funded past their inflection; at most one channel
+        per budget sits on the straight part of its hull.
+
+        Returns one frame with a row per budget: ``budget_fraction``,
+        ``budget``, ``conversions``, ``marginal_roi`` and the spend of every
+        channel. Budgets outside the bounds' total are clipped to it.
+        """
+        channels = list(avg_spends)
+        if fractions is None:
+            fractions = np.round(np.arange(0.5, 2.0001, 0.05), 2)
+        fractions = np.asarray(fractions, dtype=float)
+        lower = _per_channel(min_spend, channels, 0.0)
+        upper = _per_channel(max_spend, channels, np.inf)
+        budgets = np.clip(fractions * sum(avg_spends.values()), lower.sum(), upper.sum())
+
+        curve = self._curve(channels)
+        upper = np.minimum(upper[None, :], np.maximum(budgets[:, None], lower))
+        lower = np.broadcast_to(lower, upper.shape)
+        tangent = _hull_tangent(lower, upper, curve)
+        rise = hill(tangent, *curve) - hill(lower, *curve)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            hull_slope = np.where(tangent > lower, rise / (tangent - lower), hill_marginal(lower, *curve))
+        at_level = lambda level: _spend_at_level(level[:, None], lower, upper, tangent, hull_slope, curve)
+
+        # Bisection on log ROI for every budget at once: total spend falls
+        # as the ROI threshold rises
+        lo = np.log(np.maximum(hill_marginal(upper, *curve).min(axis=1), 1e-300)) - 1
+        hi = np.log(np.maximum(hull_slope.max(axis=1), 1e-300)) + 1
+        for _ in range(50):
+            mid = 0.5 * (lo + hi)
+            over = at_level(np.exp(mid)).sum(axis=1) > budgets
+            lo, hi = np.where(over, mid, lo), np.where(over, hi, mid)
+
+        # Interpolate between the allocations just above and below the
+        # budget so spend adds up exactly
+        under, over = at_level(np.exp(hi)), at_level(np.exp(lo))
+        gap = over.sum(axis=1) - under.sum(axis=1)
+        weight = np.where(gap > 0, (budgets - under.sum(axis=1)) / np.where(gap > 0, gap, 1), 0)
+        spend = under + (over - under) * weight[:, None]
+
+        frontier = pd.DataFrame(spend, columns=channels)
+        frontier.insert(0, 'budget_fraction', fractions)
+        frontier.insert(1, 'budget', budgets)
+        frontier.insert(2, 'conversions', hill(spend, *curve).sum(axis=1))
+        frontier.insert(3, 'marginal_roi', np.exp(0.5 * (lo + hi)))
+        return frontier
@@ -0,0 +1,252 @@
+import pandas as pd
+import numpy as np
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from multiprocessing import shared_memory
+import os
+import time
+
+from src.adstock import geometric_adstock
+from src.mmm_search import DECAY_GRID, MAX_COMBINATIONS, decay_grid_search
+
+RegionalMMM = namedtuple('RegionalMMM', ['coefficients', 'regions', 'national', 'failures', 'seconds'])
+
+# adstock x d saturation / d adstock, per SATURATIONS transform
+_SLOPES = {'linear': lambda a: a, 'log1p': lambda a: a / (1 + a), 'sqrt': lambda a: np.sqrt(a) / 2}
+
+# (region x date x [channels, target]) cube shared with the pool workers (set by _attach)
+_SHARED = {}
+
+
+def _attach(name, shape):
+    block = shared_memory.SharedMemory(name=name)
+    _SHARED['block'] = block
+    _SHARED['data'] = np.ndarray(shape, dtype=np.float64, buffer=block.buf)
+
+
+def region_cube(df, region_col='region', date_col='date', channel_col='channel', spend_col='spend',
+                target_col='conversions'):
+    """Group the long-format frame by region once into a dense (region x date x [channels, target]) cube.
+
+    Spend is summed per (region, date, channel) and the target per
+    (region, date), as the national pivot does. Dates a region has no rows
+    for are NaN in the target slot. Returns (cube, regions, dates, channels).
+    """
+    region_codes, regions = pd.factorize(df[region_col], sort=True)
+    date_codes, dates = pd.factorize(df[date_col], sort=True)
+    channel_codes, channels = pd.factorize(df[channel_col], sort=True)
+    n_regions, n_dates, n_channels = len(regions), len(dates), len(channels)
+
+    cell = (region_codes * n_dates + date_codes) * (n_channels + 1)
+    size = n_regions * n_dates * (n_channels + 1)
+    cube = np.bincount(cell + channel_codes, weights=df[spend_col].to_numpy(dtype=float), minlength=size)
+    cube += np.bincount(cell + n_channels, weights=df[target_col].to_numpy(dtype=float), minlength=size)
+    cube = cube.reshape(n_regions, n_dates, n_channels + 1)
+    observed = np.bincount(region_codes * n_dates + date_codes, minlength=n_regions * n_dates) > 0
+    cube[..., -1][~observed.reshape(n_regions, n_dates)] = np.nan
+    return cube, list(regions), pd.Index(dates, name=date_col), list(channels)
+
+
+def _fit_region(data, channels, decays, saturations, max_combinations, min_dates):
+    # One region's decay search plus OLS standard errors on the chosen design;
+    # the elasticity scale turns a coefficient into d log target / d log adstock
+    # at the region's means. Spend is adstocked over the full date axis and
+    # dates without a target are dropped afterwards, so carryover spans gaps.
+    # Channels without spend variation are left out (NaN) rather than failing
+    # the region.
+    rows = np.isfinite(data[:, -1])
+    x, y = data[:, :-1], data[rows, -1]
+    active = x[rows].std(axis=0) > 0
+    n = len(y)
+    if not active.any():
+        raise ValueError('no spend variation on any channel')
+    if n < max(min_dates, active.sum() + 2):
+        raise ValueError(f'{n} dates observed, need at least {max(min_dates, active.sum() + 2)}')
+
+    spend = pd.DataFrame(x[:, active], columns=np.asarray(channels)[active])
+    search = decay_grid_search(spend, data[:, -1], decays, saturations, max_combinations, observed=rows,
+                               n_workers=1)
+    design = search.design.to_numpy()
+    centered = design - design.mean(axis=0)
+    dof = n - active.sum() - 1
+    sigma2 = (1 - search.r2) * ((y - y.mean()) ** 2).sum() / dof if dof > 0 else np.inf
+    se = np.sqrt(sigma2 * np.diag(np.linalg.inv(centered.T @ centered)))
+    if not (np.isfinite(search.table['coef']).all() and np.isfinite(se).all()):
+        raise np.linalg.LinAlgError('singular design')
+
+    adstock = geometric_adstock(spend.to_numpy(), search.table['decay'].to_numpy())[rows]
+    slope = np.column_stack([_SLOPES[name](adstock[:, i]) for i, name in enumerate(search.table['saturation'])])
+    out = np.full((len(channels), 4), np.nan)
+    out[active] = np.column_stack([search.table['decay'], search.table['coef'], se, slope.mean(axis=0) / y.mean()])
+    saturation = np.full(len(channels), None, dtype=object)
+    saturation[active] = search.table['saturation'].to_numpy()
+    return (n, search.r2, search.intercept), out, saturation
+
+
+def _regional_task(args):
+    start, stop, channels, decays, saturations, max_combinations, min_dates = args
+    data = _SHARED['data']
+    fits, failures = [], []
+    for region in range(start, stop):
+        try:
+            fits.append((region,) + _fit_region(data[region], channels, decays, saturations, max_combinations,
+                                                 min_dates))
+        except Exception as exc:
+            failures.append((region, f'{type(exc).__name__}: {exc}'))
+    return fits, failures
+
+
+def pool_estimates(estimate, se):
+    """Random-effects pooling of (region x channel) estimates with standard errors ``se``.
+
+    Per channel, the between-region variance tau^2 is the DerSimonian-Laird
+    moment estimate and the national mean weights each region by
+    1 / (se^2 + tau^2). Each region is then shrunk toward that mean by
+    tau^2 / (tau^2 + se^2). NaN entries (channel not fitted in a region) get
+    the national mean. Returns (national, national_se, tau, shrunk, weight).
+    """
+    finite = np.isfinite(estimate) & np.isfinite(se) & (se > 0)
+    est = np.where(finite, estimate, 0.0)
+    w = np.where(finite, 1 / np.where(finite, se, 1.0) ** 2, 0.0)
+    sw = w.sum(axis=0)
+    fixed = (w * est).sum(axis=0) / np.maximum(sw, 1e-300)
+    q = (w * (est - fixed) ** 2).sum(axis=0)
+    dof = finite.sum(axis=0) - 1
+    tau2 = np.maximum(q - dof, 0) / np.maximum(sw - (w ** 2).sum(axis=0) / np.maximum(sw, 1e-300), 1e-300)
+    w_re = np.where(finite, 1 / (np.where(finite, se, 1.0) ** 2 + tau2), 0.0)
+    national = np.where(finite.any(axis=0), (w_re * est).sum(axis=0) / np.maximum(w_re.sum(axis=0), 1e-300), np.nan)
+    national_se = np.where(finite.any(axis=0), 1 / np.sqrt(np.maximum(w_re.sum(axis=0), 1e-300)), np.nan)
+    weight = np.where(finite, tau2 / (tau2 + np.where(finite, se, 1.0) ** 2), 0.0)
+    shrunk = national + weight * (est - national)
+    return national, national_se, np.sqrt(tau2), shrunk, weight
+
+
+def fit_regional_mmm(df, decays=DECAY_GRID, saturations=('log1p',), max_combinations=MAX_COMBINATIONS, min_dates=26,
+                     chunk_regions=16, n_workers=None):
+    """Per-region MMMs on a long-format (date, region, channel, spend, conversions) frame, pooled to a national estimate.
+
+    The frame is grouped by region once (``region_cube``) into a cube that
+    is placed in shared memory; pool workers attach to it and fit chunks of
+    ``chunk_regions`` regions, each with its own ``decay_grid_search``
+    (adstock decay, saturation and regression) and OLS standard errors. A
+    region that raises (too few dates, singular design, ...) is recorded in
+    ``failures`` and the run carries on; so does a chunk whose worker dies.
+
+    Coefficients are pooled as elasticities (d log conversions / d log
+    adstock at the region's means), which do not depend on region size:
+    ``pool_estimates`` forms the national random-effects estimate per
+    channel and shrinks every region toward it, and the shrunk elasticity
+    is mapped back to a coefficient on the region's own design. Standard
+    errors are conditional on the chosen decays. Channels a region never
+    varies get the national elasticity.
+
+    Channel effects are kept non-negative in every region (the
+    ``decay_grid_search`` default), so the pooled elasticities cannot be
+    pulled to the wrong sign by noisy regions; a channel with no positive
+    signal in a region sits at 0 there. Seasonality and other controls are
+    not modelled, so they end up in the residual and widen the regional
+    estimates.
+
+    Returns a RegionalMMM: ``coefficients`` indexed by (region, channel)
+    with ``decay``, ``saturation``, ``coef``, ``se``, ``elasticity``,
+    ``elasticity_se``, ``weight``, ``elasticity_shrunk`` and
+    ``coef_shrunk``; ``regions`` with ``n_dates``, ``r2`` and
+    ``intercept``; ``national`` per channel (``elasticity``, ``se``,
+    ``tau``, ``n_regions``, median ``decay``); ``failures`` (region,
+    error); and ``seconds``.
+    """
+    start_time = time.perf_counter()
+    cube, regions, dates, channels = region_cube(df)
+    n_regions, n_channels = len(regions), len(channels)
+
+    tasks = [(start, min(start + chunk_regions, n_regions), channels, list(decays), list(saturations),
+              max_combinations, min_dates) for start in range(0, n_regions, chunk_regions)]
+    fits, failures = [], []
+
+    def store(result):
+        chunk_fits, chunk_failures = result
+        fits.extend(chunk_fits)
+        failures.extend(chunk_failures)
+
+    if n_workers == 1 or len(tasks) == 1:
+        _SHARED['data'] = cube
+        for task in tasks:
+            store(_regional_task(task))
+    else:
+        n_workers = n_workers or os.cpu_count()
+        block = shared_memory.SharedMemory(create=True, size=cube.nbytes)
+        try:
+            np.ndarray(cube.shape, dtype=np.float64, buffer=block.buf)[:] = cube
+            with ProcessPoolExecutor(max_workers=n_workers, initializer=_attach,
+                                     initargs=(block.name, cube.shape)) as pool:
+                pending = {}
+
+                def collect(done):
+                    for future in done:
+                        task = pending.pop(future)
+                        try:
+                            store(future.result())
+                        except Exception as exc:
+                            failures.extend((region, f'{type(exc).__name__}: {exc}')
+                                            for region in range(task[0], task[1]))
+
+                for task in tasks:
+                    if len(pending) >= 2 * n_workers:
+                        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                        collect(done)
+                    pending[pool.submit(_regional_task, task)] = task
+                collect(list(pending))
+        finally:
+            block.close()
+            block.unlink()
+    _SHARED.pop('data', None)
+
+    fits.sort(key=lambda fit: fit[0])
+    index = [fit[0] for fit in fits]
+    stats = np.array([fit[2] for fit in fits]).reshape(len(fits), n_channels, 4)
+    decay, coef, se, scale = np.moveaxis(stats, 2, 0)
+    elasticity, elasticity_se = coef * scale, se * scale
+    national, national_se, tau, shrunk, weight = pool_estimates(elasticity, elasticity_se)
+    national_table = pd.DataFrame({'elasticity': national, 'se': national_se, 'tau': tau,
+                                   'n_regions': np.isfinite(elasticity).sum(axis=0),
+                                   'decay': np.nanmedian(decay, axis=0) if fits else np.nan},
+                                  index=pd.Index(channels, name='channel'))
+
+    coefficients = pd.DataFrame({
+        'decay': decay.ravel(),
+        'saturation': np.concatenate([fit[3] for fit in fits]) if fits else [],
+        'coef': coef.ravel(), 'se': se.ravel(), 'elasticity': elasticity.ravel(),
+        'elasticity_se': elasticity_se.ravel(), 'weight': weight.ravel(), 'elasticity_shrunk': shrunk.ravel(),
+        'coef_shrunk': (shrunk / scale).ravel(),
+    }, index=pd.MultiIndex.from_product([[regions[i] for i in index], channels], names=['region', 'channel']))
+    region_table = pd.DataFrame([fit[1] for fit in fits], columns=['n_dates', 'r2', 'intercept'],
+                                index=pd.Index([regions[i] for i in index], name='region'))
+    failures = pd.DataFrame([(regions[i], error) for i, error in sorted(failures)], columns=['region', 'error'])
+    return RegionalMMM(coefficients, region_table, national_table, failures, time.perf_counter() - start_time)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Per-region MMMs pooled toward a national estimate.')
+    parser.add_argument('input', nargs='?', default='data/marketing_spend_geo.csv',
+                        help='long-format CSV with date, region, channel, spend, conversions '
+                             '(python src/generate_data.py --marketing writes one)')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--chunk-regions', type=int, default=16)
+    parser.add_argument('--min-dates', type=int, default=26)
+    parser.add_argument('--output', default=None, help='optional CSV path for the per-region coefficients')
+    args = parser.parse_args()
+
+    df_geo = pd.read_csv(args.input)
+    if 'region' not in df_geo.columns:
+        raise SystemExit(f"{args.input} has no 'region' column; the national MMM covers single-series data")
+    result = fit_regional_mmm(df_geo, min_dates=args.min_dates, chunk_regions=args.chunk_regions,
+                              n_workers=args.workers)
+    print(result.national.round(4))
+    print(result.coefficients.groupby('channel')[['elasticity', 'elasticity_shrunk', 'weight']].describe().round(4).T)
+    print(f"{len(result.regions)} regions fitted, {len(result.failures)} failed in {result.seconds:.1f}s")
+    if len(result.failures):
+        print(result.failures.head(20).to_string(index=False))
+    if args.output:
+        result.coefficients.to_csv(args.output)
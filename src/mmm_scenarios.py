@@ -0,0 +1,191 @@
+import pandas as pd
+import numpy as np
+from collections import OrderedDict, namedtuple
+import hashlib
+import json
+import threading
+import time
+
+from src.mmm_engine import MMMEngine, apply_geometric_adstock
+from src.mmm_search import decay_grid_search
+
+DEFAULT_PORT = 8765
+
+Scenario = namedtuple('Scenario', ['total_budget', 'allocation', 'conversions', 'model_version', 'cached',
+                                   'warm_start', 'seconds'])
+
+
+def build_engine(df_mmm):
+    """Fit the per-channel response curves the way the MMM section does.
+
+    Picks each channel's decay with ``decay_grid_search`` on its own
+    conversions, adstocks, fits all Hill curves in one batch. Returns
+    (engine, avg_spends).
+    """
+    spend = df_mmm.pivot_table(index='date', columns='channel', values='spend', observed=True)
+    conversions = df_mmm.pivot_table(index='date', columns='channel', values='conversions', observed=True)
+    decays = decay_grid_search(spend, conversions, saturations=('linear',)).table['decay']
+    engine = MMMEngine().fit(apply_geometric_adstock(spend.values, decays[spend.columns].values),
+                             conversions.values, list(spend.columns))
+    return engine, spend.mean().to_dict()
+
+
+def compare_scenarios(optimize, budgets, lower=0.5, upper=2.0):
+    """One row per budget from ``optimize`` (a service's or client's): conversions, cache status, allocation."""
+    rows = []
+    for budget in budgets:
+        scenario = optimize(budget, lower, upper)
+        rows.append({'total_budget': scenario.total_budget, 'conversions': scenario.conversions,
+                     'cached': scenario.cached, 'warm_start': scenario.warm_start,
+                     'ms': 1000 * scenario.seconds, **scenario.allocation})
+    return pd.DataFrame(rows)
+
+
+def model_version(engine, avg_spends):
+    """Content hash of the fitted curves and the reference spends the bounds are relative to.
+
+    Spends are rounded to 1e-6 so means computed in a different summation
+    order (pivot vs groupby) give the same version.
+    """
+    h = hashlib.sha256()
+    h.update(json.dumps({'channels': [str(ch) for ch in engine.channels],
+                         'avg_spends': {str(ch): round(float(v), 6) for ch, v in avg_spends.items()}},
+                        sort_keys=True).encode())
+    h.update(np.ascontiguousarray(engine.params.values, dtype=np.float64).tobytes())
+    return h.hexdigest()[:16]
+
+
+class ScenarioService:
+    """Budget what-ifs against fitted curves kept in memory.
+
+    ``optimize`` results are memoized in an LRU keyed by (total budget,
+    constraints, model version). A budget not in the cache is solved by
+    warm-starting ``optimize_budget`` from the cached solution with the
+    closest budget under the same constraints, so nearby what-ifs converge
+    in a few iterations. ``serve`` exposes the same calls over local HTTP
+    so scripts can share one warm cache (see ScenarioClient).
+    """
+
+    def __init__(self, engine, avg_spends, max_entries=256):
+        self.engine = engine
+        self.avg_spends = dict(avg_spends)
+        self.max_entries = max_entries
+        self.version = model_version(engine, self.avg_spends)
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _nearest(self, total_budget, constraints):
+        candidates = [(abs(key[0] - total_budget), scenario) for key, scenario in self._cache.items()
+                      if key[1:] == (constraints, self.version)]
+        return min(candidates, key=lambda item: item[0])[1] if candidates else None
+
+    def optimize(self, total_budget, lower=0.5, upper=2.0):
+        """Optimal allocation of ``total_budget`` with each channel in ``lower``..``upper`` x its current spend.
+
+        Infeasible budgets (ValueError) and solver failures (RuntimeError)
+        are raised from ``optimize_budget`` and never cached.
+        """
+        start = time.perf_counter()
+        constraints = (float(lower), float(upper))
+        key = (round(float(total_budget), 2), constraints, self.version)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]._replace(cached=True, seconds=time.perf_counter() - start)
+            nearest = self._nearest(key[0], constraints)
+
+        allocation, _ = self.engine.optimize_budget(key[0], self.avg_spends, lower, upper,
+                                                    initial_alloc=None if nearest is None else nearest.allocation)
+        allocation = {ch: float(v) for ch, v in allocation.items()}
+        conversions = float(self.engine.predict_response(list(allocation), np.array(list(allocation.values()))).sum())
+        scenario = Scenario(key[0], allocation, conversions, self.version, False, nearest is not None,
+                            time.perf_counter() - start)
+        with self._lock:
+            self._cache[key] = scenario
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return scenario
+
+    def compare(self, budgets, lower=0.5, upper=2.0):
+        """One row per budget: conversions, whether it was cached/warm-started, and the allocation."""
+        return compare_scenarios(self.optimize, budgets, lower, upper)
+
+    def serve(self, host='127.0.0.1', port=DEFAULT_PORT):
+        """Answer ``GET /optimize?budget=..&lower=..&upper=..`` and ``GET /info`` as JSON until interrupted."""
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        from urllib.parse import parse_qs, urlparse
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                try:
+                    query = {k: float(v[0]) for k, v in parse_qs(url.query).items()}
+                    if url.path == '/optimize':
+                        body = service.optimize(query['budget'], query.get('lower', 0.5),
+                                                query.get('upper', 2.0))._asdict()
+                    elif url.path == '/info':
+                        body = {'model_version': service.version, 'avg_spends': service.avg_spends,
+                                'cached_scenarios': len(service._cache)}
+                    else:
+                        self.send_error(404)
+                        return
+                except (KeyError, ValueError) as exc:
+                    self.send_error(400, str(exc))
+                    return
+                except RuntimeError as exc:
+                    self.send_error(500, str(exc))
+                    return
+                payload = json.dumps(body).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        print(f"Scenario service (model {self.version}) on http://{host}:{port}")
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+
+
+class ScenarioClient:
+    """Client for a running ``ScenarioService.serve``; ``optimize`` returns the same Scenario tuples."""
+
+    def __init__(self, url=f'http://127.0.0.1:{DEFAULT_PORT}', timeout=30):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+
+    def _get(self, path, **params):
+        from urllib.parse import urlencode
+        from urllib.request import urlopen
+        with urlopen(f'{self.url}{path}?{urlencode(params)}', timeout=self.timeout) as response:
+            return json.load(response)
+
+    def info(self):
+        return self._get('/info')
+
+    def optimize(self, total_budget, lower=0.5, upper=2.0):
+        return Scenario(**self._get('/optimize', budget=total_budget, lower=lower, upper=upper))
+
+    def compare(self, budgets, lower=0.5, upper=2.0):
+        return compare_scenarios(self.optimize, budgets, lower, upper)
+
+
+if __name__ == "__main__":
+    import argparse
+    from src.data_store import load_marketing
+
+    parser = argparse.ArgumentParser(description='Serve cached MMM budget what-ifs over local HTTP.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--max-entries', type=int, default=256, help='LRU size')
+    args = parser.parse_args()
+
+    engine, avg_spends = build_engine(load_marketing())
+    ScenarioService(engine, avg_spends, args.max_entries).serve(args.host, args.port)
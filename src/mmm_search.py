@@ -0,0 +1,195 @@
+import pandas as pd
+import numpy as np
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import os
+from scipy.optimize import nnls
+
+from src.adstock import adstock_grid
+
+DECAY_GRID = tuple(np.round(np.arange(0.0, 0.951, 0.05), 2))
+SATURATIONS = {'linear': lambda x: x, 'log1p': np.log1p, 'sqrt': np.sqrt}
+MAX_COMBINATIONS = 2_000_000
+CHUNK_COMBINATIONS = 100_000
+
+DecaySearch = namedtuple('DecaySearch', ['table', 'intercept', 'r2', 'design'])
+
+
+def _candidates(spend, decays, saturations):
+    # (time, channels, K) transformed columns, K = decays x saturations
+    grid = adstock_grid(spend, decay=np.asarray(decays, dtype=float))
+    columns = np.stack([SATURATIONS[name](grid) for name in saturations])
+    return columns.reshape(-1, *spend.shape).transpose(1, 2, 0)
+
+
+def _solve_batch(gram, zty, yty, idx):
+    # idx: (B, C) column picks into the centered (C*K) candidate Gram; solves
+    # all B normal equations together and returns (rss, coef)
+    xtx = gram[idx[:, :, None], idx[:, None, :]]
+    xty = zty[idx]
+    ridge = 1e-12 * np.trace(xtx, axis1=1, axis2=2)[:, None, None] * np.eye(idx.shape[1])
+    coef = np.linalg.solve(xtx + ridge, xty[..., None])[..., 0]
+    return yty - (coef * xty).sum(axis=1), coef
+
+
+def _nnls_rss(gram, zty, yty, idx):
+    # Non-negative least squares of one column pick from the centered Gram:
+    # with X'X = U'U, ||Xb - y||^2 = ||Ub - U'^-1 X'y||^2 + const
+    xtx, xty = gram[np.ix_(idx, idx)], zty[idx]
+    upper = np.linalg.cholesky(xtx + 1e-12 * np.trace(xtx) * np.eye(len(idx))).T
+    coef = nnls(upper, np.linalg.solve(upper.T, xty))[0]
+    return yty - 2 * coef @ xty + coef @ xtx @ coef
+
+
+def _exhaustive_task(args):
+    # Best combination among flat indices [start, stop) of the K ** C grid:
+    # (rss, flat) of the best with all coefficients >= 0 (inf if none) and of
+    # the best overall
+    gram, zty, yty, n_candidates, n_channels, start, stop = args
+    flat = np.arange(start, stop)
+    picks = np.stack(np.unravel_index(flat, (n_candidates,) * n_channels), axis=1)
+    rss, coef = _solve_batch(gram, zty, yty, picks + np.arange(n_channels) * n_candidates)
+    signed = np.where((coef >= 0).all(axis=1), rss, np.inf)
+    best, best_signed = int(np.argmin(rss)), int(np.argmin(signed))
+    return (signed[best_signed], flat[best_signed]), (rss[best], flat[best])
+
+
+def _coordinate_descent(gram, zty, yty, start, n_candidates, max_sweeps, positive):
+    # Re-pick one channel at a time, scoring all of its candidates in one
+    # batched solve with the other channels fixed, until no pick changes.
+    # With ``positive`` candidates are scored by their non-negative fit:
+    # wrong-signed solutions are refitted by NNLS, in order of their
+    # unconstrained RSS (a lower bound) until none can beat the best so far.
+    n_channels = len(start)
+    offsets = np.arange(n_channels) * n_candidates
+    picks = start.copy()
+    for _ in range(max_sweeps):
+        changed = False
+        for c in range(n_channels):
+            idx = np.repeat((picks + offsets)[None, :], n_candidates, axis=0)
+            idx[:, c] = offsets[c] + np.arange(n_candidates)
+            rss, coef = _solve_batch(gram, zty, yty, idx)
+            if positive:
+                feasible = (coef >= 0).all(axis=1)
+                signed = np.where(feasible, rss, np.inf)
+                for k in np.argsort(rss):
+                    if rss[k] >= signed.min():
+                        break
+                    if not feasible[k]:
+                        signed[k] = _nnls_rss(gram, zty, yty, idx[k])
+                rss = signed
+            best = int(np.argmin(rss))
+            changed |= best != picks[c]
+            picks[c] = best
+        if not changed:
+            break
+    return picks
+
+
+def decay_grid_search(spend, target, decays=DECAY_GRID, saturations=('log1p',), max_combinations=MAX_COMBINATIONS,
+                      max_sweeps=20, positive=True, observed=None, n_workers=None):
+    """Pick each channel's adstock decay (and saturation transform) by least squares.
+
+    ``spend`` is a (time x channels) frame. Every candidate column
+    (decay in ``decays`` x transform in ``saturations``, see SATURATIONS)
+    is built in one ``adstock_grid`` pass and all regressions are scored
+    from the Gram matrix of those columns, solving their normal equations
+    in batches, so the cost per candidate does not grow with the series
+    length.
+
+    With a 1-D ``target`` (e.g. total conversions) one joint regression
+    with an intercept is fitted: every combination of per-channel picks is
+    scored when there are at most ``max_combinations`` of them (in chunks,
+    across a process pool when there is more than one), otherwise picks are
+    refined by coordinate descent from each channel's best single-channel
+    fit. With a (time x channels) ``target`` each channel is regressed on
+    its own column.
+
+    With ``positive`` (default) channel effects are constrained to be
+    non-negative. The exhaustive search excludes candidates whose fit has a
+    negative coefficient, and if none qualifies the best unconstrained pick
+    is refitted by non-negative least squares (a channel that only fits
+    with the wrong sign gets 0); coordinate descent scores every candidate
+    by its non-negative fit, so it can leave a start with wrong signs. The intercept is not constrained; with a
+    concave saturation it is the extrapolated response at zero spend and
+    can be negative.
+
+    ``observed`` is an optional boolean mask over time: spend is adstocked
+    over every row first (so carryover runs across dates without a target)
+    and only the observed rows enter the regression.
+
+    Returns a DecaySearch: ``table`` indexed by channel with the chosen
+    ``decay``, ``saturation`` and ``coef``, the ``intercept`` (per channel
+    for a 2-D target), ``r2``, and the chosen transformed ``design`` frame.
+    """
+    channels = list(spend.columns)
+    x = spend.to_numpy(dtype=float)
+    y = np.asarray(target, dtype=float)
+    decays, saturations = list(decays), list(saturations)
+    n_decays = len(decays)
+    columns = _candidates(x, decays, saturations)
+    index = spend.index
+    if observed is not None:
+        observed = np.asarray(observed, dtype=bool)
+        columns, y, index = columns[observed], y[observed], index[observed]
+    n_time, n_channels, n_candidates = columns.shape
+    centered = columns - columns.mean(axis=0)
+
+    if y.ndim == 2:
+        yc = y - y.mean(axis=0)
+        sxx = (centered ** 2).sum(axis=0)
+        sxy = np.einsum('tck,tc->ck', centered, yc)
+        rss = (yc ** 2).sum(axis=0)[:, None] - sxy ** 2 / np.maximum(sxx, 1e-300)
+        slope = sxy / np.maximum(sxx, 1e-300)
+        if positive:
+            # A channel with no positive-slope candidate keeps its best pick at coefficient 0
+            signed = np.where(slope >= 0, rss, np.inf)
+            feasible = np.isfinite(signed).any(axis=1)
+            picks = np.where(feasible, signed.argmin(axis=1), rss.argmin(axis=1))
+            slope = np.where(feasible[:, None], slope, 0.0)
+            rss = np.where(feasible[:, None], rss, (yc ** 2).sum(axis=0)[:, None])
+        else:
+            picks = rss.argmin(axis=1)
+        coef = slope[np.arange(n_channels), picks]
+        design = columns[:, np.arange(n_channels), picks]
+        intercept = pd.Series(y.mean(axis=0) - coef * design.mean(axis=0), index=channels)
+        r2 = pd.Series(1 - rss[np.arange(n_channels), picks] / (yc ** 2).sum(axis=0), index=channels)
+    else:
+        yc = y - y.mean()
+        flat = centered.reshape(n_time, -1)
+        gram, zty, yty = flat.T @ flat, flat.T @ yc, yc @ yc
+        n_combinations = n_candidates ** n_channels
+        if n_combinations <= max_combinations:
+            bounds = np.arange(0, n_combinations + CHUNK_COMBINATIONS, CHUNK_COMBINATIONS).clip(max=n_combinations)
+            tasks = [(gram, zty, yty, n_candidates, n_channels, start, stop)
+                     for start, stop in zip(bounds[:-1], bounds[1:])]
+            n_workers = n_workers or os.cpu_count()
+            if n_workers == 1 or len(tasks) == 1:
+                results = [_exhaustive_task(task) for task in tasks]
+            else:
+                with ProcessPoolExecutor(max_workers=n_workers) as pool:
+                    results = list(pool.map(_exhaustive_task, tasks))
+            best_signed, best = min(r[0] for r in results), min(r[1] for r in results)
+            best = best_signed[1] if positive and np.isfinite(best_signed[0]) else best[1]
+            picks = np.array(np.unravel_index(best, (n_candidates,) * n_channels))
+        else:
+            single = np.diagonal(gram).reshape(n_channels, n_candidates)
+            score = zty.reshape(n_channels, n_candidates) ** 2 / np.maximum(single, 1e-300)
+            if positive:
+                score = np.where(zty.reshape(n_channels, n_candidates) >= 0, score, -1.0)
+            start = score.argmax(axis=1)
+            picks = _coordinate_descent(gram, zty, yty, start, n_candidates, max_sweeps, positive)
+        idx = picks + np.arange(n_channels) * n_candidates
+        rss, coef = _solve_batch(gram, zty, yty, idx[None, :])
+        rss, coef = rss[0], coef[0]
+        if positive and (coef < 0).any():
+            coef = nnls(flat[:, idx], yc)[0]
+            rss = ((yc - flat[:, idx] @ coef) ** 2).sum()
+        design = columns[:, np.arange(n_channels), picks]
+        intercept = y.mean() - coef @ design.mean(axis=0)
+        r2 = 1 - rss / yty
+
+    table = pd.DataFrame({'decay': np.asarray(decays)[picks % n_decays],
+                          'saturation': np.asarray(saturations)[picks // n_decays],
+                          'coef': coef}, index=pd.Index(channels, name='channel'))
+    return DecaySearch(table, intercept, r2, pd.DataFrame(design, index=index, columns=spend.columns))
@@ -0,0 +1,141 @@
+import pandas as pd
+import numpy as np
+import hashlib
+import json
+import os
+import time
+
+from src.clv_fit import FitResult, bgnbd_fit, gamma_gamma_fit
+
+REGISTRY_DIR = 'data/cache/models'
+# Bump when a fitter's objective or optimizer changes so old entries miss
+FITTER_VERSION = 1
+
+MODEL_INPUTS = {
+    'bgnbd': ['frequency', 'recency', 'T'],
+    'gamma_gamma': ['frequency', 'monetary_value'],
+    # Holdout-scored penalizer search (src.clv_selection)
+    'selection': ['frequency', 'recency', 'T', 'monetary_value', 'frequency_holdout', 'spend_holdout'],
+}
+
+
+def fingerprint(summary, model, settings):
+    """Content hash of the columns a model is fitted on plus its fitter settings."""
+    h = hashlib.sha256()
+    h.update(json.dumps({'model': model, 'version': FITTER_VERSION, 'settings': settings,
+                         'n': len(summary)}, sort_keys=True).encode())
+    for col in MODEL_INPUTS[model]:
+        h.update(np.ascontiguousarray(summary[col].values, dtype=np.float64).tobytes())
+    return h.hexdigest()
+
+
+def cache_entries(root, suffix='.json'):
+    """(stat, path) of the files ending in ``suffix`` under ``root``, least recently used first."""
+    if not os.path.isdir(root):
+        return []
+    paths = [os.path.join(root, name) for name in os.listdir(root) if name.endswith(suffix)]
+    return sorted(((os.stat(p), p) for p in paths), key=lambda item: item[0].st_mtime)
+
+
+def prune_cache(root, max_entries, max_bytes, max_age_days, suffix='.json'):
+    """Evict cache files older than ``max_age_days``, then oldest-first until the count and byte limits hold."""
+    cutoff = time.time() - max_age_days * 86400
+    keep = []
+    for stat, path in cache_entries(root, suffix):
+        if stat.st_mtime < cutoff:
+            os.remove(path)
+        else:
+            keep.append((stat, path))
+    total = sum(stat.st_size for stat, _ in keep)
+    while keep and (len(keep) > max_entries or total > max_bytes):
+        stat, path = keep.pop(0)
+        total -= stat.st_size
+        os.remove(path)
+
+
+class ModelRegistry:
+    """On-disk cache of fitted CLV parameters keyed by content fingerprint.
+
+    Each entry is a small JSON file holding the parameters and fit
+    diagnostics. Hits refresh the entry's mtime, and ``prune`` evicts by age,
+    then oldest-first until the entry-count and byte limits hold.
+    """
+
+    def __init__(self, root=REGISTRY_DIR, max_entries=200, max_bytes=50 << 20, max_age_days=90):
+        self.root = root
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+        if not os.path.exists(root):
+            os.makedirs(root)
+
+    def _path(self, key):
+        return os.path.join(self.root, f'{key}.json')
+
+    def get(self, key):
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            entry = json.load(f)
+        os.utime(path)
+        return entry
+
+    def put(self, key, model, params, diagnostics):
+        entry = {'key': key, 'model': model, 'created': time.time(),
+                 'params': pd.Series(params).astype(float).to_dict(), 'diagnostics': diagnostics}
+        tmp = self._path(key) + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(entry, f, indent=2)
+        os.replace(tmp, self._path(key))
+        self.prune()
+        return entry
+
+    def _entries(self):
+        return cache_entries(self.root)
+
+    def latest(self, model):
+        """Most recently used parameters for ``model`` (warm start for a cache miss)."""
+        for _, path in reversed(self._entries()):
+            with open(path) as f:
+                entry = json.load(f)
+            if entry.get('model') == model:
+                return pd.Series(entry['params'])
+        return None
+
+    def prune(self):
+        prune_cache(self.root, self.max_entries, self.max_bytes, self.max_age_days)
+
+
+def _fit_cached(registry, model, summary, fit, settings):
+    key = fingerprint(summary, model, settings)
+    entry = registry.get(key)
+    if entry is not None:
+        diag = entry['diagnostics']
+        print(f"{model}: cache hit {key[:12]} (skipped fit)")
+        return FitResult(pd.Series(entry['params']), diag['neg_log_likelihood'], diag['n_iter'], diag['converged'])
+
+    start = time.perf_counter()
+    result = fit(summary, initial_params=registry.latest(model), **settings)
+    registry.put(key, model, result.params, {
+        'neg_log_likelihood': float(result.neg_log_likelihood), 'n_iter': int(result.n_iter),
+        'converged': result.converged, 'fit_seconds': round(time.perf_counter() - start, 4),
+        'n_customers': len(summary),
+    })
+    print(f"{model}: fitted in {result.n_iter} iterations, cached as {key[:12]}")
+    return result
+
+
+def fit_clv_models(summary, penalizer_coef=0.1, gamma_gamma_penalizer=None, registry=None):
+    """BG/NBD and Gamma-Gamma fits, reloaded from the registry when inputs and settings are unchanged.
+
+    ``gamma_gamma_penalizer`` defaults to ``penalizer_coef`` (see
+    src.clv_selection for tuning the two separately). Misses warm-start from
+    the registry's most recent parameters for that model. Returns
+    (bgnbd FitResult, gamma_gamma FitResult).
+    """
+    registry = registry or ModelRegistry()
+    gamma_gamma_penalizer = penalizer_coef if gamma_gamma_penalizer is None else gamma_gamma_penalizer
+    return (_fit_cached(registry, 'bgnbd', summary, bgnbd_fit, {'penalizer_coef': float(penalizer_coef)}),
+            _fit_cached(registry, 'gamma_gamma', summary, gamma_gamma_fit,
+                        {'penalizer_coef': float(gamma_gamma_penalizer)}))
@@ -0,0 +1,398 @@
+import pandas as pd
+import numpy as np
+import math
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from src.array_cache import arrays_from_frame
+
+RFM_STATE_PATH = 'data/cache/rfm_state.npz'
+
+
+def _to_day(ts):
+    return np.datetime64(pd.Timestamp(ts).date(), 'D').astype(np.int64)
+
+
+def _period_index(day, freq):
+    # Period ordinals matching pandas' to_period(freq): days, or W-SUN weeks
+    # (Monday-start; 1970-01-01 is a Thursday, hence the +3 shift)
+    if freq == 'D':
+        return day
+    if freq == 'W':
+        return (day + 3) // 7
+    raise ValueError(f"freq must be 'D' or 'W', got {freq!r}")
+
+
+def _collapse_periods(customer, period, amount):
+    # One row per (customer, period) with summed spend; rows must be sorted by
+    # customer, then day
+    if len(customer) == 0:
+        return customer, period, amount
+    starts = np.flatnonzero(np.r_[True, (customer[1:] != customer[:-1]) | (period[1:] != period[:-1])])
+    return customer[starts], period[starts], np.add.reduceat(amount, starts)
+
+
+def rfm_from_arrays(arrays, observation_period_end=None, freq='D'):
+    """Vectorized equivalent of lifetimes' summary_data_from_transaction_data.
+
+    Works in one pass over customer-sorted TransactionArrays (see
+    src.array_cache) with segment reductions: purchases in the same period
+    are collapsed into one (amounts summed), ``frequency`` counts repeat
+    periods, and ``monetary_value`` is the mean of repeat-period spend only
+    (0 for one-time buyers). Returns the same columns and index as lifetimes.
+    """
+    customer = np.asarray(arrays.customer)
+    day = np.asarray(arrays.day).astype(np.int64)
+    amount = np.asarray(arrays.amount, dtype=np.float64)
+
+    end = day.max() if observation_period_end is None else _to_day(observation_period_end)
+    period = _period_index(day, freq)
+    end_period = _period_index(np.int64(end), freq)
+    if observation_period_end is not None:
+        # Like lifetimes, the cut is by period: the whole period containing
+        # the end date counts (matters for freq='W' with a mid-week end)
+        keep = period <= end_period
+        customer, period, amount = customer[keep], period[keep], amount[keep]
+
+    # 1. Collapse same-period purchases (rows are sorted by customer, then day)
+    period_customer, period, period_spend = _collapse_periods(customer, period, amount)
+
+    # 2. Per-customer segment reductions over the collapsed periods
+    present, columns = _summarize_periods(period_customer, period, period_spend, len(arrays.customer_ids), end_period)
+    return pd.DataFrame(columns, index=pd.Index(np.asarray(arrays.customer_ids)[present], name='customer_id'))
+
+
+def _summarize_periods(period_customer, period, period_spend, n_customers, end_period):
+    # RFM columns from collapsed (customer, period) rows sorted by customer,
+    # then period; returns (codes of customers present, column dict)
+    first = np.r_[True, period_customer[1:] != period_customer[:-1]] if len(period_customer) else np.zeros(0, bool)
+    last = np.r_[first[1:], True] if len(period_customer) else first
+    n_periods = np.bincount(period_customer, minlength=n_customers)
+    repeat_spend = np.bincount(period_customer, weights=np.where(first, 0.0, period_spend), minlength=n_customers)
+
+    present = np.flatnonzero(n_periods)
+    frequency = n_periods[present] - 1
+    first_period = period[first]
+    last_period = period[last]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        monetary = np.where(frequency > 0, repeat_spend[present] / frequency, 0.0)
+    return present, {
+        'frequency': frequency.astype(float),
+        'recency': (last_period - first_period).astype(float),
+        'T': (end_period - first_period).astype(float),
+        'monetary_value': monetary,
+    }
+
+
+def rfm_summary(df_trans, observation_period_end=None, freq='D', customer_id_col='customer_id',
+                datetime_col='transaction_date', monetary_value_col='amount'):
+    """Frame-level wrapper around rfm_from_arrays for an unsorted transactions frame."""
+    arrays = arrays_from_frame(df_trans.rename(columns={
+        customer_id_col: 'customer_id', datetime_col: 'transaction_date', monetary_value_col: 'amount',
+    }))
+    return rfm_from_arrays(arrays, observation_period_end, freq)
+
+
+class IncrementalRFM:
+    """Append-only per-customer RFM state.
+
+    Keeps, per customer, the first and last purchase period, the number of
+    distinct purchase periods and the summed spend of repeat periods, so a
+    new batch of transactions is folded in with O(batch) work and ``T`` can
+    be advanced to any later observation end without touching history.
+    Batches must be chronological: no transaction may predate a customer's
+    last recorded purchase period. Customers are integer rows in first-seen
+    order; IDs are looked up with a binary search over a sorted copy, and
+    string IDs are only materialized per batch customer, not per row.
+    """
+
+    _FIELDS = ('first_period', 'last_period', 'n_periods', 'repeat_spend')
+
+    def __init__(self, freq='D'):
+        _period_index(np.int64(0), freq)  # validate freq early
+        self.freq = freq
+        self.customer_ids = np.zeros(0, dtype=str)
+        self._sorted_ids = self.customer_ids
+        self._sorted_rows = np.zeros(0, dtype=np.int64)
+        self.max_day = None
+        self.n_rows = 0
+        self.first_period = np.zeros(0, dtype=np.int64)
+        self.last_period = np.zeros(0, dtype=np.int64)
+        self.n_periods = np.zeros(0, dtype=np.int64)
+        self.repeat_spend = np.zeros(0, dtype=np.float64)
+
+    def __len__(self):
+        return len(self.customer_ids)
+
+    def _grow(self, size):
+        if size <= len(self.n_periods):
+            return
+        capacity = max(size, 2 * len(self.n_periods), 1024)
+        for name in self._FIELDS:
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def _rows_for(self, ids):
+        # State rows of distinct string IDs, appending unseen ones
+        ids = np.asarray(ids, dtype=str)
+        pos = np.searchsorted(self._sorted_ids, ids)
+        found = pos < len(self._sorted_ids)
+        found[found] = self._sorted_ids[pos[found]] == ids[found]
+        rows = np.empty(len(ids), dtype=np.int64)
+        rows[found] = self._sorted_rows[pos[found]]
+        new = np.flatnonzero(~found)
+        if len(new):
+            new = new[np.argsort(ids[new], kind='stable')]
+            rows[new] = len(self.customer_ids) + np.arange(len(new))
+            dtype = np.result_type(self.customer_ids, ids)
+            self.customer_ids = np.concatenate([self.customer_ids.astype(dtype), ids[new]])
+            self._sorted_ids = np.insert(self._sorted_ids.astype(dtype), pos[new], ids[new])
+            self._sorted_rows = np.insert(self._sorted_rows, pos[new], rows[new])
+            self._grow(len(self.customer_ids))
+        return rows
+
+    def update(self, customer_ids, days, amounts):
+        """Fold a batch of transactions (IDs, day ordinals since 1970, amounts) into the state."""
+        if len(days) == 0:
+            return self
+        codes, unique_ids = pd.factorize(np.asarray(customer_ids))
+        return self._fold(self._rows_for(unique_ids)[codes], days, amounts)
+
+    def _fold(self, row, days, amounts, grouped=False):
+        # ``grouped``: rows already contiguous per customer and day-sorted
+        days = np.asarray(days).astype(np.int64)
+        period = _period_index(days, self.freq)
+        amounts = np.asarray(amounts, dtype=np.float64)
+        if not grouped:
+            order = np.lexsort((period, row))
+            row, period, amounts = row[order], period[order], amounts[order]
+
+        # Collapse same (customer, period) purchases inside the batch
+        row, period, spend = _collapse_periods(row, period, amounts)
+        batch_first = np.r_[True, row[1:] != row[:-1]]
+        batch_last = np.r_[batch_first[1:], True]
+
+        seen = self.n_periods[row] > 0
+        if np.any(seen & batch_first & (period < self.last_period[row])):
+            raise ValueError("Batch contains purchases older than a customer's last recorded period")
+
+        # A batch's first period either extends the customer's last period
+        # (same day/week) or opens a new one; only the very first period of
+        # a brand-new customer is excluded from repeat spend.
+        merges = batch_first & seen & (period == self.last_period[row])
+        opens_first = batch_first & ~seen
+        counts_spend = np.where(merges, self.n_periods[row] > 1, ~opens_first)
+
+        new_customers = row[opens_first]
+        self.first_period[new_customers] = period[opens_first]
+        np.add.at(self.n_periods, row[~merges], 1)
+        np.add.at(self.repeat_spend, row, np.where(counts_spend, spend, 0.0))
+        self.last_period[row[batch_last]] = period[batch_last]
+
+        self.n_rows += len(days)
+        batch_max = int(days.max())
+        self.max_day = batch_max if self.max_day is None else max(self.max_day, batch_max)
+        return self
+
+    def update_arrays(self, arrays, mask=None):
+        """Fold TransactionArrays rows (optionally a boolean ``mask`` of them) into the state."""
+        customer, day, amount = np.asarray(arrays.customer), arrays.day, arrays.amount
+        if mask is not None:
+            customer, day, amount = customer[mask], day[mask], amount[mask]
+        if len(customer) == 0:
+            return self
+        # Rows are sorted by customer code, then day: map each run's code once
+        starts = np.flatnonzero(np.r_[True, customer[1:] != customer[:-1]])
+        rows = self._rows_for(np.asarray(arrays.customer_ids)[customer[starts]])
+        row = np.repeat(rows, np.diff(np.r_[starts, len(customer)]))
+        return self._fold(row, day, amount, grouped=True)
+
+    def summary(self, observation_period_end=None):
+        """RFM frame at ``observation_period_end`` (defaults to the latest day seen)."""
+        rows = self._sorted_rows
+        end = self.max_day if observation_period_end is None else _to_day(observation_period_end)
+        end_period = _period_index(np.int64(end), self.freq)
+        frequency = self.n_periods[rows] - 1
+        with np.errstate(invalid='ignore', divide='ignore'):
+            monetary = np.where(frequency > 0, self.repeat_spend[rows] / frequency, 0.0)
+        return pd.DataFrame({
+            'frequency': frequency.astype(float),
+            'recency': (self.last_period[rows] - self.first_period[rows]).astype(float),
+            'T': (end_period - self.first_period[rows]).astype(float),
+            'monetary_value': monetary,
+        }, index=pd.Index(self._sorted_ids, name='customer_id'))
+
+    def save(self, path):
+        n = len(self.customer_ids)
+        tmp = f'{path}.tmp.npz'
+        np.savez(tmp, customer_ids=self.customer_ids, sorted_rows=self._sorted_rows, freq=self.freq,
+                 max_day=-1 if self.max_day is None else self.max_day, n_rows=self.n_rows,
+                 **{name: getattr(self, name)[:n] for name in self._FIELDS})
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            state = cls(str(data['freq']))
+            state.customer_ids = data['customer_ids']
+            state._sorted_rows = (data['sorted_rows'] if 'sorted_rows' in data.files
+                                  else np.argsort(state.customer_ids, kind='stable'))
+            state._sorted_ids = state.customer_ids[state._sorted_rows]
+            max_day = int(data['max_day'])
+            state.max_day = None if max_day < 0 else max_day
+            state.n_rows = int(data['n_rows'])
+            for name in cls._FIELDS:
+                setattr(state, name, data[name].copy())
+        return state
+
+
+def update_rfm_state(arrays, path=RFM_STATE_PATH, freq='D'):
+    """Load the saved RFM state, fold in days newer than it has seen, and save it.
+
+    Assumes the feed appends whole days: rows on or before the state's
+    latest day are treated as already applied. If that history no longer
+    matches what the state has seen (data regenerated rather than appended),
+    or no state exists, it is rebuilt from all of ``arrays`` in one
+    vectorized update.
+    """
+    state = IncrementalRFM.load(path) if os.path.exists(path) else IncrementalRFM(freq)
+    day = np.asarray(arrays.day)
+    if state.freq != freq or (state.max_day is not None and np.count_nonzero(day <= state.max_day) != state.n_rows):
+        state = IncrementalRFM(freq)
+    if state.max_day is None:
+        state.update_arrays(arrays)
+    elif day.size and day.max() > state.max_day:
+        state.update_arrays(arrays, day > state.max_day)
+    else:
+        return state
+    out_dir = os.path.dirname(path)
+    if out_dir and not os.path.exists(out_dir):
+        os.makedirs(out_dir)
+    state.save(path)
+    return state
+
+
+def _max_rss_mb():
+    # Peak RSS in MB, or None where the resource module is unavailable (Windows);
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1 << 20) if sys.platform == 'darwin' else rss / 1024, 1)
+
+
+def _spill_partials(spill_dir, ids, period, spend, n_buckets):
+    # Collapse one chunk to (customer, period, spend) partial aggregates and
+    # append them to the bucket file of each customer (hash of the ID)
+    codes, unique_ids = pd.factorize(ids)
+    order = np.lexsort((period, codes))
+    codes, period, spend = _collapse_periods(codes[order], period[order], spend[order])
+    bucket = (pd.util.hash_array(np.asarray(unique_ids, dtype=object)) % n_buckets).astype(np.int64)[codes]
+    order = np.argsort(bucket, kind='stable')
+    bounds = np.searchsorted(bucket[order], np.arange(n_buckets + 1))
+    for b in np.flatnonzero(np.diff(bounds)):
+        rows = order[bounds[b]:bounds[b + 1]]
+        with open(os.path.join(spill_dir, f'{b}.npy'), 'ab') as f:
+            np.save(f, np.asarray(unique_ids[codes[rows]], dtype=str))
+            np.save(f, period[rows])
+            np.save(f, spend[rows])
+
+
+def _merge_bucket(path, end_period):
+    # Merge one bucket's partial aggregates: every customer's rows are in it
+    parts = [[], [], []]
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        while f.tell() < size:
+            for part in parts:
+                part.append(np.load(f))
+    ids, period, spend = (np.concatenate(part) for part in parts)
+    codes, unique_ids = pd.factorize(ids)
+    order = np.lexsort((period, codes))
+    customer, period, spend = _collapse_periods(codes[order], period[order], spend[order])
+    present, columns = _summarize_periods(customer, period, spend, len(unique_ids), end_period)
+    return pd.DataFrame(columns, index=pd.Index(np.asarray(unique_ids)[present], name='customer_id'))
+
+
+def rfm_from_csv_chunked(csv_path, observation_period_end=None, chunk_rows=2_000_000, freq='D',
+                         customer_id_col='customer_id', datetime_col='transaction_date',
+                         monetary_value_col='amount', n_buckets=None, spill_dir=None, track_memory=False):
+    """Out-of-core RFM summary for transaction files larger than RAM.
+
+    Reads ``chunk_rows`` rows at a time, collapses each chunk to partial
+    per-(customer, period) aggregates and spills them to ``n_buckets``
+    files by a hash of the customer ID (under a temporary directory in
+    ``spill_dir``). Each bucket then holds every partial of its customers
+    and is merged on its own, so rows may come in any order and peak memory
+    is one chunk plus one bucket; the default ``n_buckets`` sizes buckets
+    at about one chunk of CSV. The result matches rfm_from_arrays on the
+    same data. Run statistics (rows, seconds, peak process RSS where the
+    platform reports it, plus peak traced allocations with
+    ``track_memory``, which slows the run) are printed and stored in
+    ``summary.attrs['rfm_stream']``.
+    """
+    end = None if observation_period_end is None else _to_day(observation_period_end)
+    n_buckets = n_buckets or max(1, math.ceil(os.path.getsize(csv_path) / (chunk_rows * 40)))
+    if track_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+
+    spill = tempfile.mkdtemp(prefix='rfm_spill_', dir=spill_dir)
+    try:
+        reader = pd.read_csv(csv_path, usecols=[customer_id_col, datetime_col, monetary_value_col],
+                             dtype={customer_id_col: str, monetary_value_col: np.float64},
+                             chunksize=chunk_rows)
+        n_rows, max_day = 0, None
+        for chunk in reader:
+            days = pd.to_datetime(chunk[datetime_col]).values.astype('datetime64[D]').astype(np.int64)
+            period = _period_index(days, freq)
+            keep = np.ones(len(days), bool) if end is None else period <= _period_index(end, freq)
+            n_rows += len(chunk)
+            if not keep.any():  # e.g. an append log past a historical cutoff
+                continue
+            max_day = int(days.max()) if max_day is None else max(max_day, int(days.max()))
+            _spill_partials(spill, chunk[customer_id_col].values[keep], period[keep],
+                            chunk[monetary_value_col].values[keep], n_buckets)
+
+        end_period = _period_index(np.int64(end if end is not None else max_day or 0), freq)
+        pieces = [_merge_bucket(os.path.join(spill, f'{b}.npy'), end_period) for b in range(n_buckets)
+                  if os.path.exists(os.path.join(spill, f'{b}.npy'))]
+    finally:
+        shutil.rmtree(spill, ignore_errors=True)
+
+    summary = pd.concat(pieces).sort_index() if pieces else pd.DataFrame(
+        columns=['frequency', 'recency', 'T', 'monetary_value'], index=pd.Index([], name='customer_id'), dtype=float)
+    stats = {'rows': n_rows, 'customers': len(summary), 'chunk_rows': chunk_rows, 'buckets': n_buckets,
+             'seconds': round(time.perf_counter() - started, 3), 'max_rss_mb': _max_rss_mb()}
+    if track_memory:
+        stats['peak_traced_mb'] = round(tracemalloc.get_traced_memory()[1] / (1 << 20), 1)
+        tracemalloc.stop()
+    summary.attrs['rfm_stream'] = stats
+    print("Streamed RFM summary: " + ", ".join(f"{k}={v}" for k, v in stats.items()))
+    return summary
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Stream a transactions CSV into an RFM summary.')
+    parser.add_argument('csv_path', nargs='?', default='data/transactions.csv')
+    parser.add_argument('--chunk-rows', type=int, default=2_000_000)
+    parser.add_argument('--end', default=None, help='observation_period_end (default: last transaction date)')
+    parser.add_argument('--freq', default='D', choices=['D', 'W'])
+    parser.add_argument('--output', default=None, help='optional CSV path for the summary frame')
+    parser.add_argument('--track-memory', action='store_true', help='also report peak traced allocations')
+    args = parser.parse_args()
+
+    summary = rfm_from_csv_chunked(args.csv_path, args.end, args.chunk_rows, args.freq,
+                                   track_memory=args.track_memory)
+    if args.output:
+        summary.to_csv(args.output)